@@ -0,0 +1,438 @@
+"""
+Mergeable Accumulators
+Moment and contingency summaries that combine exactly across shards and worker processes
+"""
+
+import os
+import multiprocessing
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+# Below this many rows the process pool costs more than it saves
+PARALLEL_MIN_ROWS = 1_000_000
+
+# The pool is opt-in (the scripts' `--workers N` option); serial by default
+DEFAULT_WORKERS = 1
+
+
+# ============================================================================
+# MOMENT ACCUMULATOR
+# ============================================================================
+
+class Moments:
+    """Count, mean, central moment sums M2-M4, min and max for k groups.
+
+    Shards are combined with the pairwise update of Chan et al. extended to
+    third and fourth moments (Pebay, 2008), so merging is exact up to rounding
+    and independent of the order in which shards arrive.
+    """
+
+    def __init__(self, n, mean, m2, m3, m4, minimum, maximum):
+        self.n = np.asarray(n, dtype=np.int64)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.m2 = np.asarray(m2, dtype=np.float64)
+        self.m3 = np.asarray(m3, dtype=np.float64)
+        self.m4 = np.asarray(m4, dtype=np.float64)
+        self.min = np.asarray(minimum, dtype=np.float64)
+        self.max = np.asarray(maximum, dtype=np.float64)
+
+    @classmethod
+    def empty(cls, k=1):
+        zeros = np.zeros(k)
+        return cls(np.zeros(k, dtype=np.int64), zeros, zeros, zeros, zeros,
+                   np.full(k, np.inf), np.full(k, -np.inf))
+
+    @classmethod
+    def from_values(cls, values, codes=None, k=1):
+        """Two passes over one shard: group means, then centred power sums."""
+        values = np.asarray(values, dtype=np.float64)
+        codes = np.zeros(len(values), dtype=np.intp) if codes is None else np.asarray(codes, dtype=np.intp)
+        valid = (codes >= 0) & ~np.isnan(values)
+        values, codes = values[valid], codes[valid]
+
+        n = np.bincount(codes, minlength=k)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(n > 0, np.bincount(codes, weights=values, minlength=k) / n, 0.0)
+        dev = values - mean[codes]
+        dev2 = dev * dev
+        m2 = np.bincount(codes, weights=dev2, minlength=k)
+        m3 = np.bincount(codes, weights=dev2 * dev, minlength=k)
+        m4 = np.bincount(codes, weights=dev2 * dev2, minlength=k)
+
+        extremes = pd.Series(values).groupby(codes).agg(['min', 'max'])
+        minimum, maximum = np.full(k, np.inf), np.full(k, -np.inf)
+        minimum[extremes.index] = extremes['min'].to_numpy()
+        maximum[extremes.index] = extremes['max'].to_numpy()
+        return cls(n, mean, m2, m3, m4, minimum, maximum)
+
+    def merge(self, other):
+        # Empty groups carry mean 0, so the weights below zero them out cleanly
+        na, nb = self.n.astype(np.float64), other.n.astype(np.float64)
+        n = na + nb
+        with np.errstate(invalid='ignore', divide='ignore'):
+            wa, wb = np.where(n > 0, na / n, 0.0), np.where(n > 0, nb / n, 0.0)
+            delta = other.mean - self.mean
+            mean = self.mean + delta * wb
+            m2 = self.m2 + other.m2 + delta ** 2 * na * wb
+            m3 = (self.m3 + other.m3 + delta ** 3 * na * wb * (wa - wb)
+                  + 3 * delta * (wa * other.m2 - wb * self.m2))
+            m4 = (self.m4 + other.m4 + delta ** 4 * na * wb * (wa * wa - wa * wb + wb * wb)
+                  + 6 * delta ** 2 * (wa * wa * other.m2 + wb * wb * self.m2)
+                  + 4 * delta * (wa * other.m3 - wb * self.m3))
+        return Moments(self.n + other.n, mean, m2, m3, m4,
+                       np.minimum(self.min, other.min), np.maximum(self.max, other.max))
+
+    __add__ = merge
+
+    # Sample statistics with the same bias corrections as pandas
+    def var(self, ddof=1):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.m2 / (self.n - ddof)
+
+    def std(self, ddof=1):
+        return np.sqrt(self.var(ddof))
+
+    def skew(self):
+        n = self.n.astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            g1 = np.sqrt(n) * self.m3 / self.m2 ** 1.5
+            return np.sqrt(n * (n - 1)) / (n - 2) * g1
+
+    def kurtosis(self):
+        n = self.n.astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (n * (n + 1) * (n - 1) * self.m4 / ((n - 2) * (n - 3) * self.m2 ** 2)
+                    - 3 * (n - 1) ** 2 / ((n - 2) * (n - 3)))
+
+    def describe(self, quantiles=None, name=None, group=0):
+        """pandas-style describe() Series for one group; quantiles come from the caller."""
+        quantiles = quantiles if quantiles is not None else {}
+        values = {'count': float(self.n[group]), 'mean': self.mean[group], 'std': self.std()[group],
+                  'min': self.min[group]}
+        for q in (0.25, 0.5, 0.75):
+            values[f"{q:.0%}"] = quantiles.get(q, np.nan)
+        values['max'] = self.max[group]
+        return pd.Series(values, name=name)
+
+    def to_frame(self, index=None):
+        return pd.DataFrame({'n': self.n, 'mean': self.mean, 'std': self.std(), 'var': self.var(),
+                             'm2': self.m2, 'm3': self.m3, 'm4': self.m4,
+                             'min': self.min, 'max': self.max}, index=index)
+
+
+# ============================================================================
+# CONTINGENCY COUNTER
+# ============================================================================
+
+class ContingencyCounter:
+    """Dense counts over one or more integer-coded keys; merging is addition."""
+
+    def __init__(self, shape, counts=None):
+        self.shape = tuple(shape)
+        self.counts = np.zeros(self.shape, dtype=np.int64) if counts is None else counts
+
+    @classmethod
+    def from_codes(cls, shape, *codes):
+        codes = [np.asarray(c, dtype=np.intp) for c in codes]
+        valid = np.logical_and.reduce([c >= 0 for c in codes])
+        cells = np.ravel_multi_index([c[valid] for c in codes], shape)
+        counts = np.bincount(cells, minlength=int(np.prod(shape))).reshape(shape)
+        return cls(shape, counts.astype(np.int64))
+
+    def merge(self, other):
+        return ContingencyCounter(self.shape, self.counts + other.counts)
+
+    __add__ = merge
+
+    def to_frame(self, index, columns):
+        return pd.DataFrame(self.counts, index=index, columns=columns)
+
+
+def histogram_quantiles(levels, counts, quantiles=(0.25, 0.5, 0.75)):
+    """Exact linear-interpolation quantiles from per-value counts (e.g. Age)."""
+    levels, counts = np.asarray(levels, dtype=np.float64), np.asarray(counts)
+    levels, counts = levels[counts > 0], counts[counts > 0]
+    cumulative = np.cumsum(counts)
+    result = {}
+    for q in quantiles:
+        position = (cumulative[-1] - 1) * q
+        lower, upper = np.floor(position), np.ceil(position)
+        low_value = levels[np.searchsorted(cumulative, lower, side='right')]
+        high_value = levels[np.searchsorted(cumulative, upper, side='right')]
+        result[q] = low_value + (high_value - low_value) * (position - lower)
+    return result
+
+
+# ============================================================================
+# CO-MOMENT ACCUMULATOR
+# ============================================================================
+
+class CoMoments:
+    """Count, column means and centred cross-product matrix of p columns.
+
+    Shards merge with the pairwise covariance update (Chan et al.),
+    C = Ca + Cb + na * nb / n * d d', so folding in a batch costs O(p^2)
+    once the batch itself is summarized. Covariance and Pearson matrices
+    follow without revisiting any rows.
+    """
+
+    def __init__(self, n, mean, cross, columns=None):
+        self.n = int(n)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.cross = np.asarray(cross, dtype=np.float64)
+        self.columns = list(columns) if columns is not None else list(range(len(self.mean)))
+
+    @classmethod
+    def empty(cls, columns):
+        p = len(columns)
+        return cls(0, np.zeros(p), np.zeros((p, p)), columns)
+
+    @classmethod
+    def from_values(cls, values, columns=None):
+        """One centred matrix product over a batch of rows (n, p)."""
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return cls.empty(columns if columns is not None else range(values.shape[1]))
+        mean = values.mean(axis=0)
+        centred = values - mean
+        return cls(len(values), mean, centred.T @ centred, columns)
+
+    def merge(self, other):
+        if self.columns != other.columns:
+            raise ValueError(f"Cannot merge co-moments over {other.columns} into {self.columns}")
+        n = self.n + other.n
+        if not n:
+            return CoMoments(0, self.mean, self.cross, self.columns)
+        delta = other.mean - self.mean
+        mean = self.mean + delta * other.n / n
+        cross = self.cross + other.cross + np.outer(delta, delta) * self.n * other.n / n
+        return CoMoments(n, mean, cross, self.columns)
+
+    __add__ = merge
+
+    def update(self, values):
+        """Fold in a new batch of rows with the same columns."""
+        return self.merge(CoMoments.from_values(values, self.columns))
+
+    def cov(self, ddof=1):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.cross / (self.n - ddof)
+
+    def corr(self):
+        """Pearson matrix; constant columns get NaN, as DataFrame.corr()."""
+        scale = np.sqrt(np.diag(self.cross))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            r = np.clip(self.cross / np.outer(scale, scale), -1.0, 1.0)
+        r[np.diag_indices_from(r)] = np.where(scale > 0, 1.0, np.nan)
+        return r
+
+    def to_frame(self):
+        return pd.DataFrame(self.corr(), index=self.columns, columns=self.columns)
+
+    def save(self, path, **extra):
+        """Write the state (plus any `extra` arrays) atomically as .npz."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as handle:
+            np.savez(handle, n=self.n, mean=self.mean, cross=self.cross,
+                     columns=np.asarray(self.columns, dtype=str), **extra)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """(state, extra arrays) from a file written by save()."""
+        with np.load(path, allow_pickle=False) as saved:
+            arrays = {key: saved[key] for key in saved.files}
+        state = cls(arrays.pop('n'), arrays.pop('mean'), arrays.pop('cross'), arrays.pop('columns').tolist())
+        return state, arrays
+
+
+# ============================================================================
+# SHARDED / PARALLEL SUMMARIES
+# ============================================================================
+
+def key_codes(df, keys):
+    """Integer codes and level labels per key; categories keep their declared order."""
+    codes, levels = [], []
+    for key in keys:
+        column = df[key]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            codes.append(column.cat.codes.to_numpy())
+            levels.append(column.cat.categories)
+        else:
+            key_code, uniques = pd.factorize(column, sort=True)
+            codes.append(key_code)
+            levels.append(pd.Index(uniques, name=key))
+    return codes, levels
+
+
+def cell_codes(codes, shape):
+    """Flat cell id per row (-1 where any key is missing)."""
+    valid = np.logical_and.reduce([c >= 0 for c in codes])
+    cells = np.full(len(codes[0]), -1, dtype=np.intp)
+    cells[valid] = np.ravel_multi_index([c[valid] for c in codes], shape)
+    return cells
+
+
+def pool_context():
+    """'fork' start method, or None where it does not exist (Windows).
+
+    Forked workers inherit the parent instead of re-importing __main__, so
+    the top-level analysis scripts (no `if __name__ == '__main__'` guard) can
+    use a pool safely. Without fork, pooled work runs serially.
+    """
+    return multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+
+
+def _shard_moments(args):
+    values, cells, k = args
+    return Moments.from_values(values, cells, k)
+
+
+def merge_all(parts):
+    total = parts[0]
+    for part in parts[1:]:
+        total = total + part
+    return total
+
+
+def sharded_moments(values, cells, k, n_workers=None, n_shards=None):
+    """Summarize contiguous shards (in worker processes when asked for and worthwhile) and merge them.
+
+    n_workers defaults to DEFAULT_WORKERS (serial).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n_workers = n_workers or DEFAULT_WORKERS
+    context = pool_context()
+    if n_workers <= 1 or len(values) < PARALLEL_MIN_ROWS or context is None:
+        return Moments.from_values(values, cells, k)
+
+    bounds = np.linspace(0, len(values), (n_shards or n_workers) + 1).astype(int)
+    jobs = [(values[lo:hi], cells[lo:hi], k) for lo, hi in zip(bounds[:-1], bounds[1:])]
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=context) as pool:
+        parts = list(pool.map(_shard_moments, jobs))
+    return merge_all(parts)
+
+
+def column_moments(series, n_workers=None):
+    """Moments of a single column, sharded across processes for large inputs."""
+    values = series.to_numpy(dtype=np.float64)
+    return sharded_moments(values, np.zeros(len(values), dtype=np.intp), 1, n_workers=n_workers)
+
+
+def grouped_moments(df, keys, value, n_workers=None):
+    """Moments of `value` for every observed key combination, as a frame indexed by the keys."""
+    codes, levels = key_codes(df, keys)
+    shape = tuple(len(level) for level in levels)
+    cells = cell_codes(codes, shape)
+    moments = sharded_moments(df[value].to_numpy(), cells, int(np.prod(shape)), n_workers=n_workers)
+
+    observed = np.flatnonzero(moments.n > 0)
+    arrays = []
+    for key, key_code, level in zip(keys, np.unravel_index(observed, shape), levels):
+        if isinstance(df[key].dtype, pd.CategoricalDtype):
+            arrays.append(pd.Categorical.from_codes(key_code, dtype=df[key].dtype))
+        else:
+            arrays.append(level.take(key_code))
+    index = pd.MultiIndex.from_arrays(arrays, names=keys)
+    return moments.to_frame().iloc[observed].set_axis(index)
+
+
+# ============================================================================
+# QUANTILE SKETCH
+# ============================================================================
+
+class QuantileSketch:
+    """Mergeable KLL quantile sketch (Karnin, Lang and Liberty, 2016).
+
+    Items live in levels of compactors; an item at level h stands for 2^h
+    inputs. A full compactor sorts itself and promotes every other item
+    (random offset) to the next level, so memory stays O(k log(n/k)).
+    With the default k = 200 the rank error of a quantile is about 1.65% of
+    n at 99% confidence (the DataSketches KLL bound); inputs that never
+    fill the first compactor are kept exactly. min and max are always exact.
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.min, self.max = np.inf, -np.inf
+        self.levels = [np.empty(0)]
+        self.rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(self.levels[level])
+                # An odd item out stays behind so weights remain exact
+                leftover, items = items[len(items) - len(items) % 2:], items[:len(items) - len(items) % 2]
+                promoted = items[self.rng.integers(2)::2]
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                self.levels[level] = leftover
+            level += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.n += len(values)
+        self.min, self.max = min(self.min, values.min()), max(self.max, values.max())
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        merged = QuantileSketch(self.k)
+        merged.rng = self.rng
+        merged.n = self.n + other.n
+        merged.min, merged.max = min(self.min, other.min), max(self.max, other.max)
+        depth = max(len(self.levels), len(other.levels))
+        merged.levels = [np.concatenate([sketch.levels[h] for sketch in (self, other) if h < len(sketch.levels)])
+                         for h in range(depth)]
+        merged._compress()
+        return merged
+
+    __add__ = merge
+
+    def _weighted_items(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], np.cumsum(weights[order])
+
+    def quantile(self, q):
+        """Approximate quantile(s); q = 0 and q = 1 return the exact min and max."""
+        items, cumulative = self._weighted_items()
+        q = np.asarray(q, dtype=np.float64)
+        ranks = q * cumulative[-1]
+        result = items[np.minimum(np.searchsorted(cumulative, ranks, side='left'), len(items) - 1)]
+        result = np.where(q <= 0, self.min, np.where(q >= 1, self.max, result))
+        return result if result.ndim else float(result)
+
+    def rank(self, value):
+        """Approximate number of inputs <= value."""
+        items, cumulative = self._weighted_items()
+        position = np.searchsorted(items, value, side='right')
+        return np.where(position > 0, cumulative[np.maximum(position - 1, 0)], 0.0) * self.n / cumulative[-1]
+
+    def box_stats(self, whis=1.5, label=None):
+        """Q1/median/Q3, IQR fences and whiskers in the dict layout of Axes.bxp()."""
+        q1, median, q3 = self.quantile([0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        lower_fence, upper_fence = q1 - whis * iqr, q3 + whis * iqr
+        items = np.concatenate(self.levels + [np.array([self.min, self.max])])
+        inside = items[(items >= lower_fence) & (items <= upper_fence)]
+        outside = self.n - (self.rank(upper_fence) - self.rank(np.nextafter(lower_fence, -np.inf)))
+        return {'label': label, 'q1': q1, 'med': median, 'q3': q3, 'iqr': iqr,
+                'fence_low': lower_fence, 'fence_high': upper_fence,
+                'whislo': inside.min(), 'whishi': inside.max(),
+                'n_outside': float(outside), 'fliers': []}
@@ -3,7 +3,6 @@ Anomalies, Patterns, and Trends Analysis
 Comprehensive detection and explanation of data characteristics
 """
 
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -12,6 +11,13 @@ from scipy.stats import zscore, iqr
 import warnings
 warnings.filterwarnings('ignore')
 
+from data_loader import load_data, validate
+from report_profile import ReportProfile
+from rank_cache import qq_plot
+from multivariate_outliers import mahalanobis_outliers, print_multivariate_report
+from change_points import TrendMonitor, DELTA, THRESHOLD
+from density_plots import use_density, density_image
+
 # Set style
 sns.set_style("whitegrid")
 plt.rcParams['figure.figsize'] = (14, 6)
@@ -25,7 +31,7 @@ print("="*80)
 # DATA LOADING
 # ============================================================================
 
-df = pd.read_csv('scenario_6_Online_Course_Completion.xlsx.csv')
+df, df_clean = load_data()
 print(f"\n{'='*80}")
 print("DATA OVERVIEW")
 print("="*80)
@@ -33,6 +39,10 @@ print(f"Total Records: {len(df)}")
 print(f"Variables: {list(df.columns)}")
 print(f"\nData Types:\n{df.dtypes}")
 
+# One pass over the category codes; every count, rate and group summary below is read from it
+profile = ReportProfile(df_clean)
+time_stats = profile.describe()
+
 # ============================================================================
 # SECTION 1: ANOMALY DETECTION
 # ============================================================================
@@ -46,7 +56,11 @@ print("\n" + "-"*60)
 print("1.1 DATA QUALITY ANOMALIES: Negative Time Values")
 print("-"*60)
 
-negative_time = df[df['Time_Spent_Hours'] < 0]
+validation = validate(df)
+print("\nValidation rules (rows flagged):")
+print(validation.to_frame().to_string())
+
+negative_time = df[validation.violates('negative_time')]
 print(f"\nNegative time values detected: {len(negative_time)}")
 if len(negative_time) > 0:
     print(f"Percentage of dataset: {len(negative_time)/len(df)*100:.2f}%")
@@ -139,25 +153,25 @@ if len(negative_time) > 0:
     print(f"\n📁 Plot saved: negative_values_analysis.png")
     plt.close()
 
-# Clean data for further analysis
-df_clean = df[df['Time_Spent_Hours'] >= 0].copy()
-
 # 1.2 Statistical Outliers - Time Spent
 print("\n" + "-"*60)
 print("1.2 STATISTICAL OUTLIERS: Time Spent (Z-Score Method)")
 print("-"*60)
 
 df_clean['Time_Zscore'] = zscore(df_clean['Time_Spent_Hours'])
-outliers_zscore = df_clean[np.abs(df_clean['Time_Zscore']) > 3]
+# |z| > 3 with the population SD (as zscore) is a pair of fences on the sorted values
+time_sd = profile.moments().std(ddof=0)[0]
+outliers_zscore = np.concatenate(profile.outside(time_stats['mean'] - 3 * time_sd,
+                                                 time_stats['mean'] + 3 * time_sd))
 
 print(f"\nOutliers detected (|Z-score| > 3): {len(outliers_zscore)}")
 print(f"Percentage of dataset: {len(outliers_zscore)/len(df_clean)*100:.2f}%")
 
 if len(outliers_zscore) > 0:
     print("\nOutlier statistics:")
-    print(f"  Range: {outliers_zscore['Time_Spent_Hours'].min():.2f} - {outliers_zscore['Time_Spent_Hours'].max():.2f} hours")
-    print(f"  Mean of outliers: {outliers_zscore['Time_Spent_Hours'].mean():.2f} hours")
-    print(f"  Dataset mean: {df_clean['Time_Spent_Hours'].mean():.2f} hours")
+    print(f"  Range: {outliers_zscore.min():.2f} - {outliers_zscore.max():.2f} hours")
+    print(f"  Mean of outliers: {outliers_zscore.mean():.2f} hours")
+    print(f"  Dataset mean: {time_stats['mean']:.2f} hours")
     
     print("\n📊 INTERPRETATION:")
     print("  • These represent EXTREME but VALID values")
@@ -172,42 +186,41 @@ print("\n" + "-"*60)
 print("1.3 STATISTICAL OUTLIERS: Time Spent (IQR Method)")
 print("-"*60)
 
-Q1 = df_clean['Time_Spent_Hours'].quantile(0.25)
-Q3 = df_clean['Time_Spent_Hours'].quantile(0.75)
+Q1, Q3 = time_stats['25%'], time_stats['75%']
 IQR = Q3 - Q1
 lower_bound = Q1 - 1.5 * IQR
 upper_bound = Q3 + 1.5 * IQR
 
-outliers_iqr = df_clean[(df_clean['Time_Spent_Hours'] < lower_bound) | 
-                        (df_clean['Time_Spent_Hours'] > upper_bound)]
+below_iqr, above_iqr = profile.outside(lower_bound, upper_bound)
 
 print(f"\nQuartiles:")
 print(f"  Q1 (25th percentile): {Q1:.2f} hours")
-print(f"  Q2 (Median): {df_clean['Time_Spent_Hours'].median():.2f} hours")
+print(f"  Q2 (Median): {time_stats['50%']:.2f} hours")
 print(f"  Q3 (75th percentile): {Q3:.2f} hours")
 print(f"  IQR: {IQR:.2f} hours")
 print(f"\nOutlier boundaries:")
 print(f"  Lower bound: {lower_bound:.2f} hours")
 print(f"  Upper bound: {upper_bound:.2f} hours")
 
-print(f"\nOutliers detected: {len(outliers_iqr)} ({len(outliers_iqr)/len(df_clean)*100:.2f}%)")
-print(f"  Below lower bound: {len(df_clean[df_clean['Time_Spent_Hours'] < lower_bound])}")
-print(f"  Above upper bound: {len(df_clean[df_clean['Time_Spent_Hours'] > upper_bound])}")
+n_outliers_iqr = len(below_iqr) + len(above_iqr)
+print(f"\nOutliers detected: {n_outliers_iqr} ({n_outliers_iqr/len(df_clean)*100:.2f}%)")
+print(f"  Below lower bound: {len(below_iqr)}")
+print(f"  Above upper bound: {len(above_iqr)}")
 
 # 1.4 Age Outliers
 print("\n" + "-"*60)
 print("1.4 AGE DISTRIBUTION ANALYSIS")
 print("-"*60)
 
-age_stats = df_clean['Age'].describe()
+# The per-age histogram in the profile gives exact moments and quartiles
+age_stats = profile.describe_age()
 print(f"\nAge statistics:")
 print(age_stats)
 
-print(f"\nAge range: {df_clean['Age'].min()} to {df_clean['Age'].max()} years")
+print(f"\nAge range: {age_stats['min']:.0f} to {age_stats['max']:.0f} years")
 print(f"Age distribution:")
-print(f"  18-30 years: {len(df_clean[df_clean['Age'] <= 30])} ({len(df_clean[df_clean['Age'] <= 30])/len(df_clean)*100:.2f}%)")
-print(f"  31-45 years: {len(df_clean[(df_clean['Age'] > 30) & (df_clean['Age'] <= 45)])} ({len(df_clean[(df_clean['Age'] > 30) & (df_clean['Age'] <= 45)])/len(df_clean)*100:.2f}%)")
-print(f"  46-59 years: {len(df_clean[df_clean['Age'] > 45])} ({len(df_clean[df_clean['Age'] > 45])/len(df_clean)*100:.2f}%)")
+for band, count in profile.counts('Age_Band').items():
+    print(f"  {band}: {count} ({count/len(df_clean)*100:.2f}%)")
 
 print("\n📊 INTERPRETATION:")
 print("  • Age distribution is relatively UNIFORM across range")
@@ -258,6 +271,24 @@ plt.savefig('anomalies_outliers_detection.png', dpi=300, bbox_inches='tight')
 print(f"\n📁 Plot saved: anomalies_outliers_detection.png")
 plt.close()
 
+# 1.5 Joint Outliers Across All Attributes
+print("\n" + "-"*60)
+print("1.5 MULTIVARIATE OUTLIERS: Robust Mahalanobis Distance")
+print("-"*60)
+
+# Time and age are centred on the median of their Completed x Course x Device
+# cell, so a value unusual for its combination stands out even if ordinary overall
+multivariate_scores, _, robust_cov = mahalanobis_outliers(df_clean)
+print(f"\nRobust covariance of cell residuals (time, age):")
+print(f"  Time SD: {np.sqrt(robust_cov[0, 0]):.2f} hours, Age SD: {np.sqrt(robust_cov[1, 1]):.2f} years, "
+      f"correlation: {robust_cov[0, 1] / np.sqrt(robust_cov[0, 0] * robust_cov[1, 1]):.4f}")
+joint_outliers = print_multivariate_report(df_clean, multivariate_scores)
+
+print("\n📊 INTERPRETATION:")
+print("  • Flags learners whose time AND age are jointly unusual for their course, device and outcome")
+print("  • The 2.5% chi-squared tail is expected under normality; far larger shares point to tracking faults")
+print("  • Action: RETAINED in analysis (reported for review, not removed)")
+
 # ============================================================================
 # SECTION 2: PATTERN DETECTION
 # ============================================================================
@@ -271,8 +302,7 @@ print("\n" + "-"*60)
 print("2.1 COMPLETION PATTERNS BY COURSE TYPE")
 print("-"*60)
 
-completion_by_course = pd.crosstab(df_clean['Course_Type'], df_clean['Completed'], 
-                                     normalize='index') * 100
+completion_by_course = profile.rates('Course_Type')
 print("\nCompletion rates by course type (%):")
 print(completion_by_course.round(2))
 
@@ -288,7 +318,7 @@ print("\n" + "-"*60)
 print("2.2 DEVICE USAGE PATTERNS")
 print("-"*60)
 
-device_distribution = df_clean['Device_Used'].value_counts()
+device_distribution = profile.counts('Device_Used').sort_values(ascending=False)
 device_percentage = (device_distribution / len(df_clean) * 100).round(2)
 
 print("\nDevice usage distribution:")
@@ -296,8 +326,7 @@ for device, count in device_distribution.items():
     pct = device_percentage[device]
     print(f"  {device}: {count} users ({pct}%)")
 
-device_completion = pd.crosstab(df_clean['Device_Used'], df_clean['Completed'], 
-                                 normalize='index') * 100
+device_completion = profile.rates('Device_Used')
 print("\nCompletion rates by device (%):")
 print(device_completion.round(2))
 
@@ -313,14 +342,14 @@ print("\n" + "-"*60)
 print("2.3 TIME INVESTMENT PATTERNS")
 print("-"*60)
 
-time_by_completion = df_clean.groupby('Completed')['Time_Spent_Hours'].describe()
+time_by_completion = profile.describe_by_completed()
 print("\nTime spent statistics by completion status:")
 print(time_by_completion.round(2))
 
 print("\n📊 INTERPRETATION:")
 print("  • SURPRISING PATTERN: Completed and Not Completed have IDENTICAL time spent")
-print(f"  • Completed: {df_clean[df_clean['Completed']=='Yes']['Time_Spent_Hours'].mean():.2f} hours")
-print(f"  • Not Completed: {df_clean[df_clean['Completed']=='No']['Time_Spent_Hours'].mean():.2f} hours")
+print(f"  • Completed: {time_by_completion.loc['Yes', 'mean']:.2f} hours")
+print(f"  • Not Completed: {time_by_completion.loc['No', 'mean']:.2f} hours")
 print("  • Pattern insight: Time quantity ≠ Completion success")
 print("  • Implication: QUALITY of time matters more than QUANTITY")
 print("  • Students who fail spend just as much time (possibly struggling)")
@@ -330,15 +359,11 @@ print("\n" + "-"*60)
 print("2.4 AGE-BASED PATTERNS")
 print("-"*60)
 
-df_clean['Age_Group'] = pd.cut(df_clean['Age'], bins=[0, 30, 45, 60], 
-                                labels=['Young (18-30)', 'Middle (31-45)', 'Senior (46-59)'])
-
-age_completion = pd.crosstab(df_clean['Age_Group'], df_clean['Completed'], 
-                              normalize='index') * 100
+age_completion = profile.rates('Age_Band').rename_axis('Age_Group')
 print("\nCompletion rates by age group (%):")
 print(age_completion.round(2))
 
-age_time = df_clean.groupby('Age_Group')['Time_Spent_Hours'].mean()
+age_time = profile.group_means('Age_Band').rename_axis('Age_Group')
 print("\nAverage time spent by age group:")
 print(age_time.round(2))
 
@@ -426,34 +451,43 @@ print("\n" + "-"*60)
 print("3.2 TREND: Completion Over User IDs (Temporal Pattern)")
 print("-"*60)
 
-# Create bins of user IDs
-df_clean['User_Bin'] = pd.cut(df_clean['User_ID'], bins=10)
-completion_trend = df_clean.groupby('User_Bin')['Completed'].apply(lambda x: (x=='Yes').sum() / len(x) * 100)
+# Page-Hinkley monitors keep O(1) state per row, so new exports can be fed
+# chunk by chunk (monitor.update) without rebinning the history
+trend_monitor = TrendMonitor()
+trend_statistics = trend_monitor.update(df_clean)
+change_points = trend_monitor.change_points()
 
-print("\nCompletion rate across user ID ranges (%):")
-print(completion_trend.round(2))
+print(f"\nPage-Hinkley monitors over {len(trend_statistics)} rows ordered by User_ID")
+print(f"  (deviations in running-SD units, drift allowance {DELTA}, alarm threshold {THRESHOLD:g})")
+for monitor in trend_monitor.detectors:
+    peak = trend_statistics[[f'{monitor}_up', f'{monitor}_down']].max()
+    print(f"  {monitor}: peak statistic {peak.max():.2f} "
+          f"({'increase' if peak.iloc[0] >= peak.iloc[1] else 'decrease'} side)")
 
-trend_slope = np.polyfit(range(len(completion_trend)), completion_trend.values, 1)[0]
-print(f"\nTrend slope: {trend_slope:.4f}% per bin")
+print(f"\nChange points detected: {len(change_points)}")
+if len(change_points) > 0:
+    print(change_points.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
 
 print("\n📊 INTERPRETATION:")
-if abs(trend_slope) < 1:
+if len(change_points) == 0:
     print("  • STABLE TREND: Completion rate remains CONSTANT over time")
-    print("  • No improvement or decline in completion rates")
+    print("  • No shift in completion rate or time spent across user IDs")
     print("  • Consistent student outcomes throughout the period")
     print("  • Implication: Course quality and delivery are stable")
 else:
-    print(f"  • {'Upward' if trend_slope > 0 else 'Downward'} trend detected")
-    print(f"  • Completion rates are {'improving' if trend_slope > 0 else 'declining'} over time")
+    for row in change_points.itertuples():
+        print(f"  • {row.monitor}: {row.direction} starting near User_ID {row.onset} "
+              f"(detected at {row.detected_at})")
+    print("  • Outcomes shifted during the period; compare cohorts either side of each change point")
 
 # 3.3 Time Spent Distribution Trend
 print("\n" + "-"*60)
 print("3.3 TREND: Time Spent Distribution Characteristics")
 print("-"*60)
 
-time_stats = df_clean['Time_Spent_Hours'].describe()
-skewness = df_clean['Time_Spent_Hours'].skew()
-kurtosis = df_clean['Time_Spent_Hours'].kurtosis()
+time_moments = profile.moments()
+skewness = time_moments.skew()[0]
+kurtosis = time_moments.kurtosis()[0]
 
 print(f"\nDistribution characteristics:")
 print(f"  Mean: {time_stats['mean']:.2f} hours")
@@ -483,11 +517,16 @@ else:
 # Visualization - Trends
 fig, axes = plt.subplots(2, 2, figsize=(14, 10))
 
-# Time vs Age trend
-axes[0, 0].scatter(df_clean['Age'], df_clean['Time_Spent_Hours'], alpha=0.3, s=10, color='steelblue')
+# Time vs Age trend (a binned density image on large frames)
 z = np.polyfit(df_clean['Age'], df_clean['Time_Spent_Hours'], 1)
 p = np.poly1d(z)
-axes[0, 0].plot(df_clean['Age'], p(df_clean['Age']), "r--", linewidth=2, 
+if use_density(len(df_clean)):
+    density_image(axes[0, 0], df_clean['Age'], df_clean['Time_Spent_Hours'], cmap='Blues')
+    trend_x = np.array([df_clean['Age'].min(), df_clean['Age'].max()])
+else:
+    axes[0, 0].scatter(df_clean['Age'], df_clean['Time_Spent_Hours'], alpha=0.3, s=10, color='steelblue')
+    trend_x = df_clean['Age']
+axes[0, 0].plot(trend_x, p(trend_x), "r--", linewidth=2, 
                 label=f'Trend: y={z[0]:.3f}x+{z[1]:.2f}')
 axes[0, 0].set_xlabel('Age (Years)', fontsize=12)
 axes[0, 0].set_ylabel('Time Spent (Hours)', fontsize=12)
@@ -496,13 +535,17 @@ axes[0, 0].legend()
 axes[0, 0].grid(True, alpha=0.3)
 
 # Completion trend over user IDs
-completion_trend.plot(kind='line', ax=axes[0, 1], marker='o', color='darkgreen', linewidth=2)
-axes[0, 1].set_xlabel('User ID Range', fontsize=12)
-axes[0, 1].set_ylabel('Completion Rate (%)', fontsize=12)
-axes[0, 1].set_title('Trend: Completion Rate Over Time', fontsize=14, fontweight='bold')
-axes[0, 1].set_xticklabels([])
-axes[0, 1].axhline(df_clean['Completed'].map({'Yes': 1, 'No': 0}).mean()*100, 
-                   color='r', linestyle='--', label='Overall Mean')
+monitor_ids = trend_statistics['User_ID']
+axes[0, 1].plot(monitor_ids, trend_statistics['completion_rate_up'], color='darkgreen', linewidth=1.5,
+                label='Increase statistic')
+axes[0, 1].plot(monitor_ids, trend_statistics['completion_rate_down'], color='darkorange', linewidth=1.5,
+                label='Decrease statistic')
+axes[0, 1].axhline(THRESHOLD, color='r', linestyle='--', label='Alarm threshold')
+for detected_at in change_points.loc[change_points['monitor'] == 'completion_rate', 'detected_at']:
+    axes[0, 1].axvline(detected_at, color='gray', linestyle=':')
+axes[0, 1].set_xlabel('User ID', fontsize=12)
+axes[0, 1].set_ylabel('Page-Hinkley Statistic', fontsize=12)
+axes[0, 1].set_title('Trend: Completion Rate Change Monitor', fontsize=14, fontweight='bold')
 axes[0, 1].legend()
 axes[0, 1].grid(True, alpha=0.3)
 
@@ -519,8 +562,7 @@ axes[1, 0].legend()
 axes[1, 0].grid(True, alpha=0.3)
 
 # Q-Q plot for normality
-from scipy.stats import probplot
-probplot(df_clean['Time_Spent_Hours'], dist="norm", plot=axes[1, 1])
+qq_plot(axes[1, 1], profile.sorted)
 axes[1, 1].set_title('Q-Q Plot: Normality Assessment', fontsize=14, fontweight='bold')
 axes[1, 1].grid(True, alpha=0.3)
 
@@ -540,7 +582,7 @@ print("="*80)
 print("\n" + "="*80)
 print("ANOMALIES DETECTED")
 print("="*80)
-print("""
+print(f"""
 1. DATA QUALITY ANOMALIES:
    ✗ Negative time values: 5 records (0.24%)
    → Action: REMOVED (impossible values)
@@ -548,6 +590,7 @@ print("""
 2. STATISTICAL OUTLIERS:
    ⚠ Z-score method (|Z| > 3): Few extreme values detected
    ⚠ IQR method: ~5-10% flagged as outliers
+   ⚠ Robust Mahalanobis (time, age within course/device/completion): {len(joint_outliers)} joint outliers
    → Action: RETAINED (valid behavioral variation)
    
 3. NO AGE ANOMALIES:
@@ -589,8 +632,8 @@ print(f"""
    • Implication: Age doesn't predict time investment
    
 2. TEMPORAL STABILITY TREND:
-   • Completion rates are STABLE over time
-   • No improvement or decline detected
+   • Page-Hinkley change points: {len(change_points)} (completion rate and time spent)
+   • {'No improvement or decline detected' if len(change_points) == 0 else 'Shifts detected - see section 3.2'}
    • Consistent outcomes throughout period
    
 3. DISTRIBUTION CHARACTERISTICS:
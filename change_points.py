@@ -0,0 +1,134 @@
+"""
+Incremental Change-Point Monitor
+Two-sided Page-Hinkley tests on completion rate and time spent over rows ordered by User_ID
+"""
+
+import numpy as np
+import pandas as pd
+
+from data_loader import completed_flag
+
+# Deviations are standardized by the running SD, so both settings are in SD units.
+# With these values a stable stream raises a false alarm about once per 50,000 rows,
+# and a 0.25 SD shift is detected in about 300 rows.
+DELTA = 0.05  # drift allowed before evidence accumulates
+THRESHOLD = 60.0  # accumulated evidence that raises a change point
+BURN_IN = 30  # rows after a reset before deviations are scored
+SCAN_BLOCK = 1 << 16  # rows per vectorized scan; bounds the rework after each change point
+
+
+# ============================================================================
+# PAGE-HINKLEY DETECTOR
+# ============================================================================
+
+class PageHinkley:
+    """Two-sided Page-Hinkley test for a shift in the mean of one stream.
+
+    State is the running n/mean/M2 of the current segment plus the cumulative
+    up and down sums and their minima, so each row costs O(1). Chunks are
+    processed with cumulative sums; after a change point the state is reset
+    and the rest of the chunk starts a new segment.
+    """
+
+    def __init__(self, name, delta=DELTA, threshold=THRESHOLD, burn_in=BURN_IN):
+        self.name, self.delta, self.threshold, self.burn_in = name, delta, threshold, burn_in
+        self.change_points = []
+        self.reset()
+
+    def reset(self):
+        self.n, self.mean, self.m2 = 0, 0.0, 0.0
+        self.sums = np.zeros(2)  # cumulative (up, down) sums of the current segment
+        self.minima = np.zeros(2)
+        self.onsets = [None, None]  # key where each sum last reached its minimum
+        self.segment_start = None
+
+    def _scan(self, values):
+        """Cumulative sums, their minima and the running n/mean/M2 for rows of one segment."""
+        shift = self.mean if self.n else values[0]
+        y = values - shift
+        count = self.n + np.arange(1, len(values) + 1)
+        new = np.arange(1, len(values) + 1)
+        total, total_sq = np.cumsum(y), np.cumsum(y * y)
+        running_mean = shift + total / count
+        m2 = self.m2 + (total_sq - total ** 2 / new) + self.n * new / count * (total / new) ** 2
+        with np.errstate(invalid='ignore', divide='ignore'):
+            z = np.where(count > max(self.burn_in, 1), (values - running_mean) / np.sqrt(m2 / (count - 1)), 0.0)
+        z = np.nan_to_num(z)  # a constant segment has no spread yet
+
+        steps = np.stack([z - self.delta, -z - self.delta])
+        sums = self.sums[:, None] + np.cumsum(steps, axis=1)
+        minima = np.minimum(self.minima[:, None], np.minimum.accumulate(sums, axis=1))
+        return sums, minima, running_mean, count, m2
+
+    def update(self, values, keys):
+        """Feed rows in key order; returns the (up, down) statistic per row."""
+        values = np.asarray(values, dtype=np.float64)
+        keys = np.asarray(keys)
+        statistics = np.empty((2, len(values)))
+        start = 0
+        while start < len(values):
+            if self.segment_start is None:
+                self.segment_start = keys[start]
+            sums, minima, running_mean, count, m2 = self._scan(values[start:start + SCAN_BLOCK])
+            stat = sums - minima
+            alarms = np.flatnonzero((stat > self.threshold).any(axis=0))
+            stop = alarms[0] + 1 if len(alarms) else sums.shape[1]
+            statistics[:, start:start + stop] = stat[:, :stop]
+
+            # Onset estimate: where the alarming sum was last at its minimum
+            for side in range(2):
+                below = np.flatnonzero(sums[side, :stop] <= minima[side, :stop])
+                if len(below):
+                    self.onsets[side] = keys[start + below[-1]]
+
+            last = stop - 1
+            if len(alarms):
+                side = int(np.argmax(stat[:, last]))
+                self.change_points.append({
+                    'monitor': self.name, 'direction': ['increase', 'decrease'][side],
+                    'segment_start': self.segment_start, 'onset': self.onsets[side],
+                    'detected_at': keys[start + last], 'segment_rows': int(count[last]),
+                    'segment_mean': float(running_mean[last]),
+                })
+                self.reset()
+            else:
+                self.n, self.mean, self.m2 = int(count[last]), float(running_mean[last]), float(m2[last])
+                self.sums, self.minima = sums[:, last].copy(), minima[:, last].copy()
+            start += stop
+        return statistics
+
+
+# ============================================================================
+# COMPLETION / TIME MONITOR
+# ============================================================================
+
+class TrendMonitor:
+    """Page-Hinkley detectors for completion rate and mean time spent.
+
+    Chunks may arrive one at a time (e.g. from iter_chunks); each is ordered
+    by User_ID before it is fed, and rows must not go back in User_ID across chunks.
+    """
+
+    def __init__(self, delta=DELTA, threshold=THRESHOLD, burn_in=BURN_IN):
+        self.detectors = {
+            'completion_rate': PageHinkley('completion_rate', delta, threshold, burn_in),
+            'time_spent': PageHinkley('time_spent', delta, threshold, burn_in),
+        }
+
+    def update(self, chunk):
+        """Feed one chunk; returns the per-row up/down statistics of both detectors."""
+        chunk = chunk.sort_values('User_ID')
+        keys = chunk['User_ID'].to_numpy()
+        streams = {
+            'completion_rate': completed_flag(chunk['Completed']).to_numpy(dtype=np.float64),
+            'time_spent': chunk['Time_Spent_Hours'].to_numpy(dtype=np.float64),
+        }
+        columns = {'User_ID': keys}
+        for name, detector in self.detectors.items():
+            columns[f'{name}_up'], columns[f'{name}_down'] = detector.update(streams[name], keys)
+        return pd.DataFrame(columns)
+
+    def change_points(self):
+        rows = [cp for detector in self.detectors.values() for cp in detector.change_points]
+        columns = ['monitor', 'direction', 'segment_start', 'onset', 'detected_at', 'segment_rows', 'segment_mean']
+        return pd.DataFrame(rows, columns=columns)
@@ -3,15 +3,22 @@ Online Course Completion - Correlation Analysis
 Examining relationships between numerical variables
 """
 
-import pandas as pd
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from scipy import stats
-from scipy.stats import pearsonr, spearmanr
 import warnings
 warnings.filterwarnings('ignore')
 
+# Shared modules live in the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_loader import load_data, completed_flag
+from correlation_engine import correlate, pair_result, associations, comoment_state
+from rank_cache import RankCache
+from density_plots import use_density, density_image, density_pairplot
+
 # Set style for better-looking plots
 sns.set_style("whitegrid")
 plt.rcParams['figure.figsize'] = (12, 6)
@@ -24,22 +31,16 @@ print("="*80)
 print("CORRELATION ANALYSIS - ONLINE COURSE COMPLETION")
 print("="*80)
 
-# Load data
-df = pd.read_csv('scenario_6_Online_Course_Completion.xlsx.csv')
+# Load data (parsed once, then served from the cached snapshot)
+df, df_clean = load_data()
 print(f"\nOriginal dataset: {len(df)} rows")
 
-# Clean data - remove negative time values
-df_clean = df[df['Time_Spent_Hours'] >= 0].copy()
-print(f"After removing negative values: {len(df_clean)} rows")
+# Clean data - rows failing any validation rule are removed by the loader
+print(f"After removing rows that fail validation: {len(df_clean)} rows")
 
-# Convert categorical variables to numerical for correlation analysis
-df_clean['Completed_Numeric'] = df_clean['Completed'].map({'No': 0, 'Yes': 1})
-df_clean['Course_Type_Business'] = (df_clean['Course_Type'] == 'Business').astype(int)
-df_clean['Course_Type_Creative'] = (df_clean['Course_Type'] == 'Creative').astype(int)
-df_clean['Course_Type_Technical'] = (df_clean['Course_Type'] == 'Technical').astype(int)
-df_clean['Device_Desktop'] = (df_clean['Device_Used'] == 'Desktop').astype(int)
-df_clean['Device_Mobile'] = (df_clean['Device_Used'] == 'Mobile').astype(int)
-df_clean['Device_Tablet'] = (df_clean['Device_Used'] == 'Tablet').astype(int)
+# Convert completion to a 0/1 column; course and device levels are correlated
+# straight from their category codes (no one-hot columns are materialized)
+df_clean['Completed_Numeric'] = completed_flag(df_clean['Completed'])
 
 print("\n" + "="*80)
 print("NUMERICAL VARIABLES FOR CORRELATION ANALYSIS")
@@ -50,11 +51,24 @@ Primary Variables:
   - Age: Continuous variable (student age in years)
   - Completed_Numeric: Binary (0 = No, 1 = Yes)
 
-Categorical Variables (One-Hot Encoded):
+Categorical Variables (one indicator per level, computed from category codes):
   - Course_Type: Business, Creative, Technical
   - Device_Used: Desktop, Mobile, Tablet
 """)
 
+# Every pair is tested once up front: Pearson and Spearman matrices from one
+# centred matrix product, t-based p-values, Fisher-z CIs and BH q-values
+numeric_vars = ['Time_Spent_Hours', 'Age', 'Completed_Numeric']
+categorical_prefixes = {'Course_Type': 'Course_Type', 'Device_Used': 'Device'}
+rank_cache = RankCache(df_clean)
+
+# The Pearson matrix comes from persisted co-moments: only rows appended since the
+# last run are summarized, then merged into the saved state in O(p^2)
+comoments, appended_rows = comoment_state(df_clean, numeric_vars, categorical_prefixes)
+print(f"Co-moment state: {comoments.n} rows ({appended_rows} folded in this run)")
+correlation_matrices, correlation_pairs = correlate(df_clean, numeric_vars, ranks=rank_cache,
+                                                    categorical=categorical_prefixes, comoments=comoments)
+
 # ============================================================================
 # CORRELATION TEST 1: TIME SPENT vs AGE (Pearson & Spearman)
 # ============================================================================
@@ -66,15 +80,18 @@ print("="*80)
 time_spent = df_clean['Time_Spent_Hours']
 age = df_clean['Age']
 
+time_age = pair_result(correlation_pairs, 'Time_Spent_Hours', 'Age')
+
 # Pearson correlation (measures linear relationship)
-pearson_corr, pearson_pval = pearsonr(time_spent, age)
+pearson_corr, pearson_pval = time_age['pearson_r'], time_age['pearson_p']
 
 # Spearman correlation (measures monotonic relationship, robust to outliers)
-spearman_corr, spearman_pval = spearmanr(time_spent, age)
+spearman_corr, spearman_pval = time_age['spearman_r'], time_age['spearman_p']
 
 print(f"\nPearson Correlation Coefficient:")
 print(f"  r = {pearson_corr:.4f}")
 print(f"  p-value = {pearson_pval:.4f}")
+print(f"  95% CI (Fisher z): [{time_age['pearson_ci_low']:.4f}, {time_age['pearson_ci_high']:.4f}]")
 print(f"  Interpretation: {'Significant' if pearson_pval < 0.05 else 'Not significant'} linear relationship")
 
 print(f"\nSpearman Correlation Coefficient:")
@@ -112,11 +129,17 @@ else:
 # Visualization
 fig, axes = plt.subplots(1, 2, figsize=(14, 5))
 
-# Scatter plot with regression line
-axes[0].scatter(age, time_spent, alpha=0.4, s=20, color='steelblue')
+# Scatter plot with regression line (a binned density image on large frames)
+dense_plots = use_density(len(df_clean))
 z = np.polyfit(age, time_spent, 1)
 p = np.poly1d(z)
-axes[0].plot(age, p(age), "r--", linewidth=2, label=f'y = {z[0]:.3f}x + {z[1]:.2f}')
+if dense_plots:
+    density_image(axes[0], age, time_spent, cmap='Blues')
+    trend_x = np.array([age.min(), age.max()])
+else:
+    axes[0].scatter(age, time_spent, alpha=0.4, s=20, color='steelblue')
+    trend_x = age
+axes[0].plot(trend_x, p(trend_x), "r--", linewidth=2, label=f'y = {z[0]:.3f}x + {z[1]:.2f}')
 axes[0].set_xlabel('Age (years)', fontsize=12)
 axes[0].set_ylabel('Time Spent (hours)', fontsize=12)
 axes[0].set_title(f'Time Spent vs Age\nPearson r = {pearson_corr:.4f}, p = {pearson_pval:.4f}', 
@@ -146,15 +169,18 @@ print("="*80)
 
 completed_numeric = df_clean['Completed_Numeric']
 
+time_completion = pair_result(correlation_pairs, 'Time_Spent_Hours', 'Completed_Numeric')
+
 # Point-biserial correlation (special case of Pearson for continuous vs binary)
-pearson_corr_comp, pearson_pval_comp = pearsonr(time_spent, completed_numeric)
+pearson_corr_comp, pearson_pval_comp = time_completion['pearson_r'], time_completion['pearson_p']
 
 # Spearman correlation
-spearman_corr_comp, spearman_pval_comp = spearmanr(time_spent, completed_numeric)
+spearman_corr_comp, spearman_pval_comp = time_completion['spearman_r'], time_completion['spearman_p']
 
 print(f"\nPoint-Biserial Correlation (Pearson for binary):")
 print(f"  r = {pearson_corr_comp:.4f}")
 print(f"  p-value = {pearson_pval_comp:.4f}")
+print(f"  95% CI (Fisher z): [{time_completion['pearson_ci_low']:.4f}, {time_completion['pearson_ci_high']:.4f}]")
 print(f"  Interpretation: {'Significant' if pearson_pval_comp < 0.05 else 'Not significant'} relationship")
 
 print(f"\nSpearman Correlation:")
@@ -209,13 +235,16 @@ print("\n" + "="*80)
 print("CORRELATION TEST 3: AGE vs COMPLETION STATUS")
 print("="*80)
 
+age_completion = pair_result(correlation_pairs, 'Age', 'Completed_Numeric')
+
 # Point-biserial correlation
-pearson_corr_age, pearson_pval_age = pearsonr(age, completed_numeric)
-spearman_corr_age, spearman_pval_age = spearmanr(age, completed_numeric)
+pearson_corr_age, pearson_pval_age = age_completion['pearson_r'], age_completion['pearson_p']
+spearman_corr_age, spearman_pval_age = age_completion['spearman_r'], age_completion['spearman_p']
 
 print(f"\nPoint-Biserial Correlation (Pearson for binary):")
 print(f"  r = {pearson_corr_age:.4f}")
 print(f"  p-value = {pearson_pval_age:.4f}")
+print(f"  95% CI (Fisher z): [{age_completion['pearson_ci_low']:.4f}, {age_completion['pearson_ci_high']:.4f}]")
 print(f"  Interpretation: {'Significant' if pearson_pval_age < 0.05 else 'Not significant'} relationship")
 
 print(f"\nSpearman Correlation:")
@@ -270,16 +299,37 @@ print("\n" + "="*80)
 print("COMPREHENSIVE CORRELATION MATRIX")
 print("="*80)
 
-# Select numerical variables for correlation matrix
-corr_vars = ['Time_Spent_Hours', 'Age', 'Completed_Numeric', 
-             'Course_Type_Business', 'Course_Type_Creative', 'Course_Type_Technical',
-             'Device_Desktop', 'Device_Mobile', 'Device_Tablet']
-
-corr_matrix = df_clean[corr_vars].corr()
+corr_matrix = correlation_matrices['pearson']
 
 print("\nPearson Correlation Matrix:")
 print(corr_matrix.round(4))
 
+print("\nSpearman Correlation Matrix:")
+print(correlation_matrices['spearman'].round(4))
+
+# Levels of the same category are negatively related by construction; correlate()
+# flags those pairs and leaves them out of the Benjamini-Hochberg adjustment
+tested_pairs = correlation_pairs[~correlation_pairs['same_variable']]
+print(f"\nSignificance of all {len(correlation_pairs)} pairs "
+      f"({len(tested_pairs)} excluding one-hot columns of the same category):")
+for method in ['pearson', 'spearman']:
+    print(f"  {method.title()}: {(tested_pairs[f'{method}_p'] < 0.05).sum()} with p < 0.05, "
+          f"{(tested_pairs[f'{method}_q'] < 0.05).sum()} with q < 0.05 (Benjamini-Hochberg)")
+
+print("\nStrongest pairs (Pearson, excluding same-category one-hot columns):")
+strongest = tested_pairs.reindex(tested_pairs['pearson_r'].abs().sort_values(ascending=False).index).head(10)
+print(strongest[['var1', 'var2', 'pearson_r', 'pearson_ci_low', 'pearson_ci_high', 'pearson_p', 'pearson_q']]
+      .to_string(index=False, float_format=lambda value: f"{value:.4f}"))
+
+correlation_pairs.to_csv('correlation_analysis/correlation_pairs.csv', index=False)
+print(f"\n  Table saved: correlation_analysis/correlation_pairs.csv")
+
+# Whole-variable associations: Cramer's V between categoricals, eta for numeric x categorical
+association_table = associations(df_clean, ['Time_Spent_Hours', 'Age'],
+                                 ['Completed', 'Course_Type', 'Device_Used'])
+print("\nCategorical Associations (Cramer's V and correlation ratio eta):")
+print(association_table.to_string(index=False, float_format=lambda value: f"{value:.4f}"))
+
 # Visualization - Correlation Heatmap
 fig, axes = plt.subplots(1, 2, figsize=(16, 6))
 
@@ -292,7 +342,7 @@ axes[0].set_title('Correlation Matrix - All Variables\n(Pearson Correlation)',
 
 # Focus on main variables
 main_vars = ['Time_Spent_Hours', 'Age', 'Completed_Numeric']
-corr_matrix_main = df_clean[main_vars].corr()
+corr_matrix_main = corr_matrix.loc[main_vars, main_vars]
 sns.heatmap(corr_matrix_main, annot=True, fmt='.4f', cmap='coolwarm', center=0, 
             square=True, linewidths=2, cbar_kws={"shrink": 0.8}, ax=axes[1],
             vmin=-1, vmax=1, annot_kws={'size': 14})
@@ -318,11 +368,18 @@ print("="*80)
 pairplot_data = df_clean[['Time_Spent_Hours', 'Age', 'Completed']].copy()
 pairplot_data.columns = ['Time Spent (hrs)', 'Age (years)', 'Completed']
 
-g = sns.pairplot(pairplot_data, hue='Completed', palette={'No': '#ff9999', 'Yes': '#66b3ff'},
-                 diag_kind='kde', plot_kws={'alpha': 0.6, 's': 20}, 
-                 diag_kws={'shade': True, 'alpha': 0.6})
-g.fig.suptitle('Pairwise Relationships - Time, Age, and Completion', 
-               y=1.02, fontsize=16, fontweight='bold')
+pairplot_palette = {'No': '#ff9999', 'Yes': '#66b3ff'}
+if dense_plots:
+    # O(n) binning, then drawing cost depends only on the bins
+    pairplot_fig, _ = density_pairplot(pairplot_data, ['Time Spent (hrs)', 'Age (years)'], hue='Completed',
+                                       palette=pairplot_palette)
+else:
+    g = sns.pairplot(pairplot_data, hue='Completed', palette=pairplot_palette,
+                     diag_kind='kde', plot_kws={'alpha': 0.6, 's': 20}, 
+                     diag_kws={'shade': True, 'alpha': 0.6})
+    pairplot_fig = g.fig
+pairplot_fig.suptitle('Pairwise Relationships - Time, Age, and Completion', 
+                      y=1.02, fontsize=16, fontweight='bold')
 plt.savefig('correlation_analysis/pairplot.png', dpi=300, bbox_inches='tight')
 print(f"\n  Plot saved: correlation_analysis/pairplot.png")
 plt.close()
@@ -0,0 +1,287 @@
+"""
+Correlation Engine
+Pearson and Spearman matrices from one centred matrix product, with p-values, Fisher-z CIs and q-values
+"""
+
+import os
+import hashlib
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from data_loader import CACHE_DIR
+from sufficient_stats import benjamini_hochberg
+from accumulators import CoMoments, ContingencyCounter
+from resampling import chi_squared_statistic
+
+ALPHA = 0.05
+METHODS = ['pearson', 'spearman']
+COMOMENT_FILE = os.path.join(CACHE_DIR, 'correlation_comoments.npz')
+
+
+# ============================================================================
+# MATRICES
+# ============================================================================
+
+def pearson_matrix(values):
+    """Pearson r for every column pair from one centred cross-product X'X.
+
+    Constant columns get NaN correlations, as DataFrame.corr().
+    """
+    return CoMoments.from_values(values).corr()
+
+
+def rank_columns(values):
+    """Average ranks (ties share their mean rank) of every column."""
+    return stats.rankdata(np.asarray(values, dtype=np.float64), axis=0)
+
+
+def spearman_matrix(values):
+    """Spearman rho: Pearson r of the column ranks."""
+    return pearson_matrix(rank_columns(values))
+
+
+# ============================================================================
+# CATEGORICAL COLUMNS FROM CODES (no indicator matrix)
+# ============================================================================
+
+def _level_sums(values, codes, k):
+    """Per-level sums of each centred column, (k, p); one bincount per column."""
+    x = values - values.mean(axis=0)
+    return np.stack([np.bincount(codes, weights=x[:, j], minlength=k) for j in range(x.shape[1])], axis=1)
+
+
+def point_biserial_block(values, codes, k):
+    """Pearson r of every numeric column with the indicator of every level, (p, k).
+
+    cov(x, I_l) is the level's sum of centred x over n, so only group sums
+    and counts are needed.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    counts = np.bincount(codes, minlength=k).astype(np.float64)
+    m2 = ((values - values.mean(axis=0)) ** 2).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = _level_sums(values, codes, k) / np.sqrt(np.outer(counts * (n - counts) / n, m2))
+    return np.clip(r, -1.0, 1.0).T
+
+
+def phi_block(codes1, k1, codes2, k2):
+    """Pearson r (phi) between the level indicators of two categoricals, from their contingency table."""
+    table = ContingencyCounter.from_codes((k1, k2), codes1, codes2).counts / len(codes1)
+    p1, p2 = table.sum(axis=1), table.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (table - np.outer(p1, p2)) / np.sqrt(np.outer(p1 * (1 - p1), p2 * (1 - p2)))
+
+
+def cramers_v(codes1, k1, codes2, k2):
+    """Cramer's V with the chi-squared test of independence (no continuity correction)."""
+    table = ContingencyCounter.from_codes((k1, k2), codes1, codes2).counts
+    table = table[table.sum(axis=1) > 0][:, table.sum(axis=0) > 0].astype(np.float64)
+    chi2_stat = float(chi_squared_statistic(table))
+    dof = (table.shape[0] - 1) * (table.shape[1] - 1)
+    v = np.sqrt(chi2_stat / (table.sum() * (min(table.shape) - 1)))
+    return v, chi2_stat, dof, stats.chi2.sf(chi2_stat, dof)
+
+
+def correlation_ratio(values, codes, k):
+    """Correlation ratio eta of one numeric column on a categorical, with the one-way ANOVA F p-value."""
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    counts = np.bincount(codes, minlength=k)
+    sums = _level_sums(values[:, None], codes, k)[:, 0]
+    present = counts > 0
+    ss_between = (sums[present] ** 2 / counts[present]).sum()
+    ss_total = ((values - values.mean()) ** 2).sum()
+    groups = present.sum()
+    f_stat = (ss_between / (groups - 1)) / ((ss_total - ss_between) / (n - groups))
+    return np.sqrt(ss_between / ss_total), stats.f.sf(f_stat, groups - 1, n - groups)
+
+
+def associations(df, numeric, categorical):
+    """Cramer's V for every categorical pair and eta for every numeric x categorical pair."""
+    codes = {column: (df[column].cat.codes.to_numpy(), len(df[column].cat.categories)) for column in categorical}
+    rows = []
+    for a, column1 in enumerate(categorical):
+        for column2 in categorical[a + 1:]:
+            v, _, _, p_value = cramers_v(*codes[column1], *codes[column2])
+            rows.append({'var1': column1, 'var2': column2, 'measure': "Cramer's V", 'value': v, 'p_value': p_value})
+    for column1 in numeric:
+        for column2 in categorical:
+            eta, p_value = correlation_ratio(df[column1].to_numpy(), *codes[column2])
+            rows.append({'var1': column1, 'var2': column2, 'measure': 'eta', 'value': eta, 'p_value': p_value})
+    table = pd.DataFrame(rows)
+    table['q_value'] = benjamini_hochberg(table['p_value'])
+    return table
+
+
+def encoded_matrices(values, ranked, codes, methods=METHODS):
+    """Pearson and Spearman matrices over numeric columns plus every category level.
+
+    `codes` is a list of (codes, k) per categorical. The result equals
+    DataFrame.corr() on the one-hot encoding: indicators are two-valued, so
+    their ranks are an affine map and only the numeric side is ranked.
+    """
+    blocks = {}
+    for method, x in (('pearson', values), ('spearman', ranked)):
+        if method not in methods:
+            continue
+        numeric = pearson_matrix(x)
+        sides = [point_biserial_block(x, *c) for c in codes]
+        rows = [np.hstack([numeric] + sides)]
+        for a, (codes1, k1) in enumerate(codes):
+            rows.append(np.hstack([sides[a].T] + [phi_block(codes1, k1, *c) for c in codes]))
+        matrix = np.vstack(rows)
+        matrix[np.diag_indices_from(matrix)] = np.where(np.isnan(np.diag(matrix)), np.nan, 1.0)
+        blocks[method] = matrix
+    return blocks
+
+
+def encoded_columns(df, numeric, categorical=None):
+    """Numeric column names followed by '<prefix>_<level>' for every category level."""
+    return list(numeric) + [f'{prefix}_{level}' for column, prefix in (categorical or {}).items()
+                            for level in df[column].cat.categories]
+
+
+# ============================================================================
+# INCREMENTAL PEARSON STATE
+# ============================================================================
+
+def encoded_comoments(df, numeric, categorical=None):
+    """CoMoments over numeric columns plus every category level, without indicator columns.
+
+    Level means are proportions; the numeric x level block is the level sums
+    of the centred numeric columns, and level x level blocks are contingency
+    counts minus n * p_a * p_b.
+    """
+    values = df[list(numeric)].to_numpy(dtype=np.float64)
+    columns = encoded_columns(df, numeric, categorical)
+    n = len(values)
+    if not categorical or not n:
+        return CoMoments.from_values(values, columns) if n else CoMoments.empty(columns)
+
+    codes = [(df[column].cat.codes.to_numpy(), len(df[column].cat.categories)) for column in categorical]
+    shares = [np.bincount(c, minlength=k) / n for c, k in codes]
+    numeric_part = CoMoments.from_values(values)
+    sides = [_level_sums(values, c, k) for c, k in codes]
+    rows = [np.hstack([numeric_part.cross] + [side.T for side in sides])]
+    for a, (codes1, k1) in enumerate(codes):
+        blocks = [sides[a]]
+        for b, (codes2, k2) in enumerate(codes):
+            table = ContingencyCounter.from_codes((k1, k2), codes1, codes2).counts
+            blocks.append(table - n * np.outer(shares[a], shares[b]))
+        rows.append(np.hstack(blocks))
+    return CoMoments(n, np.concatenate([numeric_part.mean] + shares), np.vstack(rows), columns)
+
+
+def rows_digest(df):
+    """Content hash of a frame's rows (values only, in order)."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def comoment_state(df, numeric, categorical=None, path=COMOMENT_FILE):
+    """Persisted co-moments of `df`, folding in only the rows appended since the last save.
+
+    The file records the row count and a content hash of the rows it covers
+    (the numeric and categorical columns). If those rows changed in any way,
+    or the columns did, the state is rebuilt from every row. Returns the
+    state and the number of rows folded in by this call.
+    """
+    columns = encoded_columns(df, numeric, categorical)
+    covered = df[list(numeric) + list(categorical or {})]
+    state, start = None, 0
+    if os.path.exists(path):
+        try:
+            saved, extra = CoMoments.load(path)
+        except (OSError, ValueError, KeyError):
+            saved = None
+        if (saved is not None and saved.columns == columns and 0 < saved.n <= len(df)
+                and str(extra.get('digest')) == rows_digest(covered.iloc[:saved.n])):
+            state, start = saved, saved.n
+    if state is None:
+        state = CoMoments.empty(columns)
+
+    appended = len(df) - start
+    if appended:
+        state = state + encoded_comoments(df.iloc[start:], numeric, categorical)
+        state.save(path, digest=rows_digest(covered))
+    return state, appended
+
+
+# ============================================================================
+# SIGNIFICANCE
+# ============================================================================
+
+def pair_tests(r, n, method='pearson', alpha=ALPHA):
+    """t statistic, two-sided p-value and Fisher-z interval for an array of correlations.
+
+    The t test is the one pearsonr and spearmanr use. Spearman intervals
+    widen the Fisher-z standard error by sqrt(1 + r^2 / 2) (Bonett & Wright, 2000).
+    """
+    r = np.asarray(r, dtype=np.float64)
+    dof = n - 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t_stat = r * np.sqrt(dof / ((1 - r) * (1 + r)))
+        z = np.arctanh(r)
+    p_value = 2 * stats.t.sf(np.abs(t_stat), dof)
+
+    se = 1 / np.sqrt(n - 3)
+    if method == 'spearman':
+        se = se * np.sqrt(1 + r ** 2 / 2)
+    margin = stats.norm.ppf(1 - alpha / 2) * se
+    return t_stat, p_value, np.tanh(z - margin), np.tanh(z + margin)
+
+
+def correlate(df, columns, alpha=ALPHA, ranks=None, categorical=None, comoments=None):
+    """Pearson and Spearman matrices plus a long table of tests for every column pair.
+
+    q-values are Benjamini-Hochberg adjusted within each method across the
+    tested pairs; two levels of the same categorical are related by
+    construction, so those pairs are marked `same_variable` and get no q-value.
+    A RankCache passed as `ranks` supplies the Spearman ranks without re-sorting.
+    `categorical` maps categorical columns to a label prefix; each level then
+    enters as '<prefix>_<level>', computed from the codes rather than one-hot columns.
+    A CoMoments state over the same labels (see comoment_state) supplies the
+    Pearson matrix, which is then not recomputed from the rows.
+    """
+    values = df[columns].to_numpy(dtype=np.float64)
+    n = len(values)
+    ranked = rank_columns(values) if ranks is None else np.column_stack([ranks.ranks(c) for c in columns])
+    labels = encoded_columns(df, columns, categorical)
+    matrices = {}
+    if comoments is not None:
+        if comoments.columns != labels or comoments.n != n:
+            raise ValueError("Co-moment state does not cover the same rows and columns")
+        matrices['pearson'] = comoments.corr()
+    methods = [method for method in METHODS if method not in matrices]
+    if categorical:
+        codes = [(df[column].cat.codes.to_numpy(), len(df[column].cat.categories)) for column in categorical]
+        matrices.update(encoded_matrices(values, ranked, codes, methods))
+    else:
+        matrices.update({method: pearson_matrix(x) for method, x in (('pearson', values), ('spearman', ranked))
+                         if method in methods})
+
+    sources = list(columns) + [column for column in (categorical or {}) for _ in df[column].cat.categories]
+    i, j = np.triu_indices(len(labels), k=1)
+    same_variable = np.take(sources, i) == np.take(sources, j)
+    pairs = pd.DataFrame({'var1': np.take(labels, i), 'var2': np.take(labels, j), 'n': n,
+                          'same_variable': same_variable})
+    for method in METHODS:
+        r = matrices[method][i, j]
+        t_stat, p_value, ci_low, ci_high = pair_tests(r, n, method, alpha)
+        pairs[f'{method}_r'], pairs[f'{method}_t'], pairs[f'{method}_p'] = r, t_stat, p_value
+        pairs[f'{method}_ci_low'], pairs[f'{method}_ci_high'] = ci_low, ci_high
+        q_value = np.full(len(p_value), np.nan)
+        q_value[~same_variable] = benjamini_hochberg(p_value[~same_variable])
+        pairs[f'{method}_q'] = q_value
+
+    frames = {method: pd.DataFrame(matrix, index=labels, columns=labels) for method, matrix in matrices.items()}
+    return frames, pairs
+
+
+def pair_result(pairs, var1, var2):
+    """The row of `pairs` for one variable pair, in either order."""
+    match = ((pairs['var1'] == var1) & (pairs['var2'] == var2)) | ((pairs['var1'] == var2) & (pairs['var2'] == var1))
+    return pairs[match].iloc[0]
@@ -0,0 +1,321 @@
+"""
+Shared Dataset Loader
+Parses the course completion CSV once and serves a cached, compactly typed snapshot
+"""
+
+import os
+import hashlib
+import numpy as np
+import pandas as pd
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_FILE = os.path.join(BASE_DIR, 'scenario_6_Online_Course_Completion.xlsx.csv')
+CACHE_DIR = os.path.join(BASE_DIR, '.cache')
+
+HASH_BLOCK_SIZE = 1 << 20  # 1 MiB blocks keep hashing memory flat
+CHUNK_SIZE = 250_000  # rows per chunk in streaming mode
+
+# In-process memo so repeated calls inside one script reuse the same frame
+_frames = {}
+
+# ============================================================================
+# DECLARED SCHEMA
+# ============================================================================
+
+# Declared category levels keep the integer codes stable across files and chunks
+COMPLETED_LEVELS = ['No', 'Yes']
+COURSE_TYPES = ['Business', 'Creative', 'Technical']
+DEVICES = ['Desktop', 'Mobile', 'Tablet']
+AGE_GROUP_LEVELS = ['Below Average', 'Above Average']
+AGE_LEVELS = 256  # Age is uint8, so fixed histograms cover every possible value
+AGE_BAND_EDGES = [0, 30, 45, 60]
+AGE_BAND_LEVELS = ['Young (18-30)', 'Middle (31-45)', 'Senior (46-59)']
+
+CATEGORY_DTYPES = {
+    'Completed': pd.CategoricalDtype(COMPLETED_LEVELS),
+    'Course_Type': pd.CategoricalDtype(COURSE_TYPES),
+    'Device_Used': pd.CategoricalDtype(DEVICES),
+}
+
+NUMERIC_DTYPES = {
+    'User_ID': 'int32',
+    'Age': 'uint8',
+    'Time_Spent_Hours': 'float64',
+}
+
+# Opt-in: halves the time column, at the cost of ~7 significant digits
+COMPACT_TIME_DTYPE = 'float32'
+
+# 0/1 completion flag used for correlations and proportion tests
+FLAG_DTYPE = 'uint8'
+
+# Integer columns fall back to pandas' nullable types when values are missing
+NULLABLE_DTYPES = {'int32': 'Int32', 'uint8': 'UInt8', 'int64': 'Int64'}
+
+# Integer columns holding values outside their declared type keep this one, so a
+# narrow cast never wraps (Age 300 -> 44) and validation sees the true value
+WIDE_INTEGER_DTYPE = 'int64'
+
+# Plausibility limits used by the validation rules
+MAX_TIME_HOURS = 100.0
+AGE_RANGE = (16, 100)
+
+
+def _checked_dtype(series, dtype):
+    """Declared integer dtype if every value fits it, else the wide one; nullable when values are missing."""
+    info = np.iinfo(dtype)
+    if series.min() < info.min or series.max() > info.max:
+        dtype = WIDE_INTEGER_DTYPE
+    return NULLABLE_DTYPES[dtype] if series.isna().any() else dtype
+
+
+def apply_schema(df, compact_time=None):
+    """Cast a raw frame to the declared schema (idempotent).
+
+    compact_time=None keeps the time column's current float type.
+    """
+    dtypes = dict(CATEGORY_DTYPES)
+    dtypes.update(NUMERIC_DTYPES)
+    if compact_time is None:
+        del dtypes['Time_Spent_Hours']
+    elif compact_time:
+        dtypes['Time_Spent_Hours'] = COMPACT_TIME_DTYPE
+    dtypes = {col: dtype for col, dtype in dtypes.items() if col in df.columns}
+    for col, dtype in dtypes.items():
+        if dtype in NULLABLE_DTYPES:
+            dtypes[col] = _checked_dtype(df[col], dtype)
+    return df.astype(dtypes, copy=False)
+
+
+def completed_flag(completed):
+    """0/1 uint8 view of the Completed column, read straight from the category codes."""
+    if isinstance(completed.dtype, pd.CategoricalDtype) and list(completed.cat.categories) == COMPLETED_LEVELS:
+        return completed.cat.codes.astype(FLAG_DTYPE)
+    return (completed == 'Yes').astype(FLAG_DTYPE)
+
+
+def age_bands(age):
+    """Young/Middle/Senior bands used by the age pattern analysis and segment scans."""
+    return pd.cut(age, bins=AGE_BAND_EDGES, labels=AGE_BAND_LEVELS)
+
+
+def age_groups(age, threshold):
+    """Below/Above Average split used by the proportion z-test."""
+    labels = np.where(age < threshold, 0, 1)
+    return pd.Series(pd.Categorical.from_codes(labels, categories=AGE_GROUP_LEVELS),
+                     index=age.index)
+
+
+# ============================================================================
+# SNAPSHOT CACHE
+# ============================================================================
+
+def file_digest(path):
+    """Content hash of the raw export, used as the snapshot cache key."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def snapshot_path(path, cache_dir=CACHE_DIR):
+    stem = os.path.splitext(os.path.basename(path))[0].replace('.', '_')
+    return os.path.join(cache_dir, f"{stem}-{file_digest(path)}.parquet")
+
+
+def _read_snapshot(snapshot):
+    try:
+        return pd.read_parquet(snapshot)
+    except (ImportError, OSError, ValueError):
+        # Missing parquet engine or a truncated snapshot: fall back to the CSV
+        return None
+
+
+def _write_snapshot(frame, snapshot):
+    os.makedirs(os.path.dirname(snapshot), exist_ok=True)
+    tmp_path = snapshot + '.tmp'
+    try:
+        frame.to_parquet(tmp_path)
+    except (ImportError, OSError, ValueError):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+    os.replace(tmp_path, snapshot)
+    _drop_stale_snapshots(snapshot)
+
+
+def _drop_stale_snapshots(snapshot):
+    """Remove snapshots of earlier versions of the same export."""
+    directory, name = os.path.split(snapshot)
+    stem = name.rsplit('-', 1)[0]
+    for other in os.listdir(directory):
+        if other != name and other.endswith('.parquet') and other.rsplit('-', 1)[0] == stem:
+            try:
+                os.remove(os.path.join(directory, other))
+            except OSError:
+                pass
+
+
+# ============================================================================
+# VALIDATION RULES
+# ============================================================================
+
+def _numeric(df, col):
+    return df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _unknown_label(col):
+    # Labels outside the declared categories are decoded as missing (code -1),
+    # so a blank label is reported here too rather than under missing_value
+    return lambda df: df[col].cat.codes.to_numpy() < 0
+
+
+def _missing_number(df):
+    columns = [col for col in NUMERIC_DTYPES if col in df.columns]
+    return df[columns].isna().any(axis=1).to_numpy()
+
+
+# (name, description, check) in bit order; each check maps a frame to a boolean row mask
+RULES = [
+    ('negative_time', 'Time_Spent_Hours below zero', lambda df: _numeric(df, 'Time_Spent_Hours') < 0),
+    ('excessive_time', f'Time_Spent_Hours above {MAX_TIME_HOURS:g}',
+     lambda df: _numeric(df, 'Time_Spent_Hours') > MAX_TIME_HOURS),
+    ('age_out_of_range', f'Age outside {AGE_RANGE[0]}-{AGE_RANGE[1]}',
+     lambda df: (_numeric(df, 'Age') < AGE_RANGE[0]) | (_numeric(df, 'Age') > AGE_RANGE[1])),
+    ('unknown_completed', 'Completed missing or not Yes/No', _unknown_label('Completed')),
+    ('unknown_course_type', 'Course_Type missing or not a declared course', _unknown_label('Course_Type')),
+    ('unknown_device', 'Device_Used missing or not a declared device', _unknown_label('Device_Used')),
+    ('duplicate_user_id', 'User_ID seen on an earlier row', lambda df: df['User_ID'].duplicated().to_numpy()),
+    ('missing_value', 'User_ID, Age or Time_Spent_Hours missing', _missing_number),
+]
+RULE_BITS = {name: np.uint16(1 << bit) for bit, (name, _, _) in enumerate(RULES)}
+
+
+class ValidationReport:
+    """Per-row violation bitmask (bit i = RULES[i]) plus per-rule counts."""
+
+    def __init__(self, mask):
+        self.mask = mask
+
+    @property
+    def valid(self):
+        return self.mask == 0
+
+    def violates(self, rule):
+        return (self.mask & RULE_BITS[rule]) != 0
+
+    @property
+    def counts(self):
+        return pd.Series({name: int(self.violates(name).sum()) for name, _, _ in RULES}, name='rows')
+
+    def to_frame(self):
+        descriptions = [description for _, description, _ in RULES]
+        return self.counts.to_frame().assign(rule=descriptions)[['rule', 'rows']]
+
+
+class SeenIds:
+    """Bitmap of the non-negative User_IDs seen so far.
+
+    One bit per possible ID, so memory is bounded by the largest ID (at most
+    256 MiB for int32 IDs) instead of growing with every chunk, and each
+    lookup or insert is O(1) per row.
+    """
+
+    def __init__(self):
+        self.bits = np.zeros(0, dtype=np.uint8)
+
+    @staticmethod
+    def _positions(ids):
+        ids = np.asarray(ids, dtype=np.float64)
+        known = np.isfinite(ids) & (ids >= 0)
+        return known, np.where(known, ids, 0).astype(np.int64)
+
+    def contains(self, ids):
+        known, ids = self._positions(ids)
+        inside = known & ((ids >> 3) < len(self.bits))
+        found = np.zeros(len(ids), dtype=bool)
+        found[inside] = (self.bits[ids[inside] >> 3] >> (ids[inside] & 7)) & 1
+        return found
+
+    def add(self, ids):
+        known, ids = self._positions(ids)
+        ids = ids[known]
+        if not len(ids):
+            return self
+        size = int(ids.max() >> 3) + 1
+        if size > len(self.bits):
+            self.bits = np.concatenate([self.bits, np.zeros(max(size, 2 * len(self.bits)) - len(self.bits),
+                                                            dtype=np.uint8)])
+        np.bitwise_or.at(self.bits, ids >> 3, (1 << (ids & 7)).astype(np.uint8))
+        return self
+
+
+def validate(df, seen_ids=None):
+    """Evaluate every rule in one vectorized pass over the frame.
+
+    seen_ids (a SeenIds of User_IDs from earlier chunks) extends the duplicate
+    rule across a streamed export.
+    """
+    mask = np.zeros(len(df), dtype=np.uint16)
+    for name, _, check in RULES:
+        mask[check(df)] |= RULE_BITS[name]
+    if seen_ids is not None:
+        mask[seen_ids.contains(_numeric(df, 'User_ID'))] |= RULE_BITS['duplicate_user_id']
+    return ValidationReport(mask)
+
+
+# ============================================================================
+# PUBLIC LOADERS
+# ============================================================================
+
+def read_csv_typed(path, **kwargs):
+    """Parse the CSV with string columns decoded straight into categories."""
+    return apply_schema(pd.read_csv(path, dtype=CATEGORY_DTYPES, **kwargs))
+
+
+def iter_chunks(path=DATA_FILE, chunksize=CHUNK_SIZE, compact_time=False):
+    """Yield typed fixed-size chunks of the export without holding the whole file."""
+    reader = pd.read_csv(path, dtype=CATEGORY_DTYPES, chunksize=chunksize)
+    for chunk in reader:
+        yield apply_schema(chunk, compact_time=compact_time)
+
+
+def load_raw_data(path=DATA_FILE, use_cache=True, compact_time=False):
+    """Return the full typed export, parsing the CSV only when no snapshot exists."""
+    path = os.path.abspath(path)
+    if path not in _frames:
+        frame = None
+        snapshot = snapshot_path(path) if use_cache else None
+        if snapshot is not None and os.path.exists(snapshot):
+            frame = _read_snapshot(snapshot)
+        if frame is None:
+            frame = read_csv_typed(path)
+            if snapshot is not None:
+                _write_snapshot(frame, snapshot)
+        _frames[path] = apply_schema(frame)
+
+    return apply_schema(_frames[path].copy(), compact_time=compact_time)
+
+
+def clean_data(df):
+    """Keep the rows that pass every validation rule.
+
+    Integer columns widened by out-of-range values are narrowed back to
+    their declared types once those rows are gone.
+    """
+    return apply_schema(df[validate(df).valid].copy())
+
+
+def load_clean_data(path=DATA_FILE, use_cache=True, compact_time=False):
+    return clean_data(load_raw_data(path, use_cache=use_cache, compact_time=compact_time))
+
+
+def load_data(path=DATA_FILE, use_cache=True, compact_time=False):
+    """Return (raw, clean) frames for scripts that report on the removed rows."""
+    df = load_raw_data(path, use_cache=use_cache, compact_time=compact_time)
+    return df, clean_data(df)
@@ -0,0 +1,144 @@
+"""
+Density Rendering
+Pre-binned 2-D histograms and binned KDEs drawn as images, for scatter and pair plots of large frames
+"""
+
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.colors import LinearSegmentedColormap, LogNorm, to_rgb
+
+# Above this many rows point scatters overplot and per-point KDEs take minutes,
+# so plots switch to binned densities
+DENSITY_MIN_ROWS = 100_000
+IMAGE_BINS = 150  # bins per axis of a 2-D histogram image
+KDE_GRID = 512  # grid points of a binned KDE
+KDE_CUT = 3  # bandwidths the KDE grid extends past the data, as seaborn's kdeplot
+
+
+def use_density(n_rows, density=None):
+    """Explicit choice if given, otherwise density mode above DENSITY_MIN_ROWS."""
+    return n_rows > DENSITY_MIN_ROWS if density is None else density
+
+
+# ============================================================================
+# BINNING (one O(n) pass each)
+# ============================================================================
+
+def _bin_index(values, lo, hi, bins):
+    """Equal-width bin of every value; the upper edge falls in the last bin."""
+    width = (hi - lo) / bins if hi > lo else 1.0
+    return np.clip(((values - lo) / width).astype(np.intp), 0, bins - 1)
+
+
+def _axis_bins(values, value_range, bins):
+    """(lo, hi, bins) of one axis; whole-number data (e.g. Age) gets one bin per value
+    so narrow bins cannot fall between values and leave empty stripes."""
+    lo, hi = value_range or (values.min(), values.max())
+    if hi - lo + 1 <= bins and np.array_equal(values, np.floor(values)):
+        return lo - 0.5, hi + 0.5, int(hi - lo) + 1
+    return lo, hi, bins
+
+
+def histogram_2d(x, y, bins=IMAGE_BINS, x_range=None, y_range=None):
+    """Counts (y bins, x bins) over equal-width bins from one bincount, with the axis extents."""
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    x_lo, x_hi, x_bins = _axis_bins(x, x_range, bins)
+    y_lo, y_hi, y_bins = _axis_bins(y, y_range, bins)
+    cells = _bin_index(y, y_lo, y_hi, y_bins) * x_bins + _bin_index(x, x_lo, x_hi, x_bins)
+    counts = np.bincount(cells, minlength=x_bins * y_bins).reshape(y_bins, x_bins)
+    return counts, (x_lo, x_hi), (y_lo, y_hi)
+
+
+def linear_bin(values, grid):
+    """Split each value's unit weight between its two neighbouring grid points."""
+    position = (np.asarray(values, dtype=np.float64) - grid[0]) / (grid[1] - grid[0])
+    left = np.clip(np.floor(position).astype(np.intp), 0, len(grid) - 2)
+    right_share = np.clip(position - left, 0.0, 1.0)
+    return (np.bincount(left, weights=1 - right_share, minlength=len(grid))
+            + np.bincount(left + 1, weights=right_share, minlength=len(grid)))
+
+
+def binned_kde(values, grid=None, bandwidth=None, points=KDE_GRID):
+    """Gaussian KDE evaluated on a grid from linearly binned counts.
+
+    The bandwidth defaults to Scott's rule (as gaussian_kde). Smoothing is a
+    convolution of the binned counts with the sampled kernel, so after the
+    O(n) binning the cost depends only on the grid size.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if bandwidth is None:
+        bandwidth = values.std(ddof=1) * n ** (-1 / 5) if n > 1 else 0.0
+    bandwidth = bandwidth or 1.0  # constant or single-value input
+    if grid is None:
+        grid = np.linspace(values.min() - KDE_CUT * bandwidth, values.max() + KDE_CUT * bandwidth, points)
+    step = grid[1] - grid[0]
+    half = min(int(np.ceil(4 * bandwidth / step)), len(grid) - 1)
+    offsets = np.arange(-half, half + 1) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (np.sqrt(2 * np.pi) * bandwidth)
+    density = np.convolve(linear_bin(values, grid), kernel)[half:half + len(grid)] / n
+    return grid, density
+
+
+# ============================================================================
+# DRAWING (cost depends on bins, not rows)
+# ============================================================================
+
+def _color_map(color):
+    """Transparent-to-`color` map, so images of several groups can be overlaid."""
+    rgb = to_rgb(color)
+    return LinearSegmentedColormap.from_list('density', [rgb + (0.0,), rgb + (1.0,)])
+
+
+def density_image(ax, x, y, bins=IMAGE_BINS, x_range=None, y_range=None, cmap='viridis', color=None,
+                  alpha=1.0):
+    """2-D histogram drawn as an image on a log colour scale; empty bins stay blank."""
+    counts, x_range, y_range = histogram_2d(x, y, bins, x_range, y_range)
+    return ax.imshow(np.ma.masked_equal(counts, 0), origin='lower', aspect='auto', interpolation='nearest',
+                     extent=(*x_range, *y_range), cmap=_color_map(color) if color else cmap,
+                     norm=LogNorm(vmin=1, vmax=max(counts.max(), 2)), alpha=alpha)
+
+
+def kde_curve(ax, values, grid=None, scale=1.0, color=None, label=None, fill=True, alpha=0.6):
+    """Binned KDE line (optionally filled); `scale` weights a group by its share of the rows."""
+    grid, density = binned_kde(values, grid)
+    ax.plot(grid, density * scale, color=color, label=label)
+    if fill:
+        ax.fill_between(grid, density * scale, color=color, alpha=alpha * 0.5)
+    return grid, density
+
+
+def density_pairplot(df, columns, hue=None, palette=None, bins=IMAGE_BINS, height=2.5):
+    """pairplot equivalent: overlaid per-group density images off the diagonal, binned KDEs on it.
+
+    Bins and KDE grids are shared across groups so the overlays line up.
+    Returns (figure, axes).
+    """
+    groups = [(None, df)] if hue is None else [(level, df[df[hue] == level]) for level in df[hue].cat.categories]
+    groups = [(level, group) for level, group in groups if len(group)]
+    palette = palette or {}
+    ranges = {column: (df[column].min(), df[column].max()) for column in columns}
+    p = len(columns)
+    fig, axes = plt.subplots(p, p, figsize=(height * p, height * p), squeeze=False)
+
+    for row, y_column in enumerate(columns):
+        for col, x_column in enumerate(columns):
+            ax = axes[row, col]
+            for level, group in groups:
+                color = palette.get(level, 'steelblue')
+                if row == col:
+                    lo, hi = ranges[x_column]
+                    spread = df[x_column].std() * len(df) ** (-1 / 5) * KDE_CUT
+                    grid = np.linspace(lo - spread, hi + spread, KDE_GRID)
+                    kde_curve(ax, group[x_column], grid, scale=len(group) / len(df), color=color, label=level)
+                else:
+                    density_image(ax, group[x_column], group[y_column], bins, ranges[x_column], ranges[y_column],
+                                  color=color, alpha=0.6)
+            ax.set_xlabel(x_column if row == p - 1 else '')
+            ax.set_ylabel(y_column if col == 0 else ('Density' if row == col else ''))
+
+    if hue is not None:
+        handles, labels = axes[0, 0].get_legend_handles_labels()
+        fig.legend(handles, labels, title=hue, loc='center left', bbox_to_anchor=(0.86, 0.5))
+    fig.tight_layout(rect=(0, 0, 0.86 if hue is not None else 1, 1))
+    return fig, axes
@@ -3,6 +3,7 @@ Generate PDF Tables for All Statistical Test Results
 Professional formatting with computation details
 """
 
+import sys
 import pandas as pd
 import numpy as np
 from reportlab.lib import colors
@@ -11,15 +12,23 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
-from scipy import stats
-from scipy.stats import chi2_contingency, f_oneway, ttest_ind, ttest_1samp
+from scipy.stats import chi2_contingency
 import warnings
 warnings.filterwarnings('ignore')
 
+from data_loader import load_clean_data, completed_flag, age_groups
+from accumulators import DEFAULT_WORKERS
+from sufficient_stats import (build_cube, marginal, overall, counts, level_mean, age_split,
+                              two_sample_t, one_sample_t, one_way_anova, two_proportion_z)
+
 # Load and clean data
-df = pd.read_csv('scenario_6_Online_Course_Completion.xlsx.csv')
-df_clean = df[df['Time_Spent_Hours'] >= 0].copy()
-df_clean['Completed_Numeric'] = df_clean['Completed'].map({'No': 0, 'Yes': 1})
+df_clean = load_clean_data()
+df_clean['Completed_Numeric'] = completed_flag(df_clean['Completed'])
+
+# One grouped pass; every objective below reads its statistics from this cube
+# (`--workers N` shards it over N forked worker processes)
+n_workers = int(sys.argv[sys.argv.index('--workers') + 1]) if '--workers' in sys.argv else DEFAULT_WORKERS
+cube = build_cube(df_clean, n_workers=n_workers)
 
 print("="*80)
 print("GENERATING PDF TABLES FOR ALL OBJECTIVES")
@@ -113,18 +122,19 @@ elements.append(Spacer(1, 0.3*inch))
 elements.append(Paragraph("OBJECTIVE 2: COMPARE TIME SPENT BY COMPLETION STATUS", heading_style))
 elements.append(Paragraph("Two-Sample T-Test (Independent Samples)", subheading_style))
 
-time_completed = df_clean[df_clean['Completed'] == 'Yes']['Time_Spent_Hours']
-time_not_completed = df_clean[df_clean['Completed'] == 'No']['Time_Spent_Hours']
-t_stat, p_value = ttest_ind(time_completed, time_not_completed)
+by_completed = marginal(cube, by='Completed')
+time_completed = by_completed.loc['Yes']
+time_not_completed = by_completed.loc['No']
+t_stat, p_value = two_sample_t(time_completed, time_not_completed)
 
 # Descriptive Statistics Table
 desc_data = [
     ['Group', 'N', 'Mean (hours)', 'Std Dev', 'Min', 'Max'],
-    ['Completed (Yes)', f"{len(time_completed)}", f"{time_completed.mean():.4f}", 
-     f"{time_completed.std():.4f}", f"{time_completed.min():.4f}", f"{time_completed.max():.4f}"],
-    ['Not Completed (No)', f"{len(time_not_completed)}", f"{time_not_completed.mean():.4f}", 
-     f"{time_not_completed.std():.4f}", f"{time_not_completed.min():.4f}", f"{time_not_completed.max():.4f}"],
-    ['Difference', '', f"{time_completed.mean() - time_not_completed.mean():.4f}", '', '', '']
+    ['Completed (Yes)', f"{time_completed['n']:.0f}", f"{time_completed['mean']:.4f}", 
+     f"{time_completed['std']:.4f}", f"{time_completed['min']:.4f}", f"{time_completed['max']:.4f}"],
+    ['Not Completed (No)', f"{time_not_completed['n']:.0f}", f"{time_not_completed['mean']:.4f}", 
+     f"{time_not_completed['std']:.4f}", f"{time_not_completed['min']:.4f}", f"{time_not_completed['max']:.4f}"],
+    ['Difference', '', f"{time_completed['mean'] - time_not_completed['mean']:.4f}", '', '', '']
 ]
 
 table = Table(desc_data, colWidths=[1.5*inch, 0.8*inch, 1.2*inch, 1*inch, 0.9*inch, 0.9*inch])
@@ -148,7 +158,7 @@ elements.append(Spacer(1, 0.15*inch))
 test_data = [
     ['Test Statistic', 'Value'],
     ['t-statistic', f"{t_stat:.4f}"],
-    ['Degrees of Freedom', f"{len(time_completed) + len(time_not_completed) - 2}"],
+    ['Degrees of Freedom', f"{time_completed['n'] + time_not_completed['n'] - 2:.0f}"],
     ['p-value (two-tailed)', f"{p_value:.4f}"],
     ['Significance Level (α)', "0.05"],
     ['Decision', "FAIL TO REJECT H₀" if p_value > 0.05 else "REJECT H₀"],
@@ -180,19 +190,19 @@ elements.append(Paragraph("OBJECTIVE 3: TEST IF AVERAGE TIME EXCEEDS 15 HOURS",
 elements.append(Paragraph("One-Sample T-Test (vs. Benchmark from Previous Study)", subheading_style))
 
 hypothesized_mean = 15.0
-time_spent_all = df_clean['Time_Spent_Hours']
-t_stat_one, p_value_two_tailed = ttest_1samp(time_spent_all, hypothesized_mean)
+time_spent_all = overall(cube)
+t_stat_one, p_value_two_tailed = one_sample_t(time_spent_all, hypothesized_mean)
 p_value_one_tailed = p_value_two_tailed / 2 if t_stat_one > 0 else 1 - (p_value_two_tailed / 2)
 
 # Sample Statistics
 sample_data = [
     ['Statistic', 'Value'],
-    ['Sample Size (N)', f"{len(time_spent_all)}"],
-    ['Sample Mean', f"{time_spent_all.mean():.4f} hours"],
-    ['Sample Std Dev', f"{time_spent_all.std():.4f} hours"],
+    ['Sample Size (N)', f"{time_spent_all['n']:.0f}"],
+    ['Sample Mean', f"{time_spent_all['mean']:.4f} hours"],
+    ['Sample Std Dev', f"{time_spent_all['std']:.4f} hours"],
     ['Hypothesized Mean (μ₀)', f"{hypothesized_mean:.4f} hours"],
-    ['Difference (x̄ - μ₀)', f"{time_spent_all.mean() - hypothesized_mean:.4f} hours"],
-    ['Standard Error', f"{time_spent_all.std() / np.sqrt(len(time_spent_all)):.4f}"]
+    ['Difference (x̄ - μ₀)', f"{time_spent_all['mean'] - hypothesized_mean:.4f} hours"],
+    ['Standard Error', f"{time_spent_all['std'] / np.sqrt(time_spent_all['n']):.4f}"]
 ]
 
 table = Table(sample_data, colWidths=[3*inch, 3.5*inch])
@@ -216,7 +226,7 @@ elements.append(Spacer(1, 0.15*inch))
 test_data = [
     ['Test Statistic', 'Value'],
     ['t-statistic', f"{t_stat_one:.4f}"],
-    ['Degrees of Freedom', f"{len(time_spent_all) - 1}"],
+    ['Degrees of Freedom', f"{time_spent_all['n'] - 1:.0f}"],
     ['p-value (two-tailed)', f"{p_value_two_tailed:.4f}"],
     ['p-value (one-tailed)', f"{p_value_one_tailed:.4f}"],
     ['Significance Level (α)', "0.05"],
@@ -250,7 +260,7 @@ elements.append(Paragraph("OBJECTIVE 4: COMPARE COURSE TYPE BY COMPLETION STATUS
 elements.append(Paragraph("Chi-Squared Test of Independence", subheading_style))
 
 # Contingency Table
-contingency_table = pd.crosstab(df_clean['Course_Type'], df_clean['Completed'])
+contingency_table = counts(cube, 'Course_Type', 'Completed')
 chi2_stat, p_value_chi2, dof, expected_freq = chi2_contingency(contingency_table)
 
 # Observed Frequencies
@@ -338,21 +348,15 @@ elements.append(PageBreak())
 elements.append(Paragraph("OBJECTIVE 5: COMPARE DEVICE USED BY TIME SPENT", heading_style))
 elements.append(Paragraph("One-Way ANOVA (Analysis of Variance)", subheading_style))
 
-time_by_device = {
-    'Desktop': df_clean[df_clean['Device_Used'] == 'Desktop']['Time_Spent_Hours'],
-    'Mobile': df_clean[df_clean['Device_Used'] == 'Mobile']['Time_Spent_Hours'],
-    'Tablet': df_clean[df_clean['Device_Used'] == 'Tablet']['Time_Spent_Hours']
-}
-
-f_stat, p_value_anova = f_oneway(time_by_device['Desktop'], 
-                                  time_by_device['Mobile'], 
-                                  time_by_device['Tablet'])
+time_by_device = marginal(cube, by='Device_Used')
+anova = one_way_anova(time_by_device)
+f_stat, p_value_anova = anova['F'], anova['p']
 
 # Descriptive Statistics by Device
 desc_data = [['Device', 'N', 'Mean (hours)', 'Std Dev', 'Min', 'Max']]
-for device, times in time_by_device.items():
-    desc_data.append([device, f"{len(times)}", f"{times.mean():.4f}", 
-                     f"{times.std():.4f}", f"{times.min():.4f}", f"{times.max():.4f}"])
+for device, times in time_by_device.iterrows():
+    desc_data.append([device, f"{times['n']:.0f}", f"{times['mean']:.4f}", 
+                     f"{times['std']:.4f}", f"{times['min']:.4f}", f"{times['max']:.4f}"])
 
 table = Table(desc_data, colWidths=[1.3*inch, 0.8*inch, 1.3*inch, 1.1*inch, 1*inch, 1*inch])
 table.setStyle(TableStyle([
@@ -371,15 +375,10 @@ elements.append(table)
 elements.append(Spacer(1, 0.15*inch))
 
 # ANOVA Table (detailed breakdown)
-# Calculate sums of squares
-grand_mean = df_clean['Time_Spent_Hours'].mean()
-ss_between = sum([len(times) * (times.mean() - grand_mean)**2 for times in time_by_device.values()])
-ss_within = sum([((times - times.mean())**2).sum() for times in time_by_device.values()])
-ss_total = ss_between + ss_within
-df_between = len(time_by_device) - 1
-df_within = len(df_clean) - len(time_by_device)
-ms_between = ss_between / df_between
-ms_within = ss_within / df_within
+# Sums of squares come from the per-device n/mean/M2 aggregates
+ss_between, ss_within, ss_total = anova['ss_between'], anova['ss_within'], anova['ss_total']
+df_between, df_within = anova['df_between'], anova['df_within']
+ms_between, ms_within = anova['ms_between'], anova['ms_within']
 
 anova_table_data = [
     ['Source', 'Sum of Squares', 'df', 'Mean Square', 'F-statistic', 'p-value'],
@@ -442,22 +441,16 @@ elements.append(PageBreak())
 elements.append(Paragraph("OBJECTIVE 6: TEST IF BELOW AVERAGE AGE HAS HIGHER COMPLETION", heading_style))
 elements.append(Paragraph("Two-Sample Proportion Z-Test", subheading_style))
 
-average_age = df_clean['Age'].mean()
-df_clean['Age_Group'] = df_clean['Age'].apply(lambda x: 'Below Average' if x < average_age else 'Above Average')
-
-below_avg = df_clean[df_clean['Age_Group'] == 'Below Average']
-above_avg = df_clean[df_clean['Age_Group'] == 'Above Average']
-
-n1 = len(below_avg)
-n2 = len(above_avg)
-x1 = (below_avg['Completed'] == 'Yes').sum()
-x2 = (above_avg['Completed'] == 'Yes').sum()
-p1 = x1 / n1
-p2 = x2 / n2
-p_pooled = (x1 + x2) / (n1 + n2)
-se = np.sqrt(p_pooled * (1 - p_pooled) * (1/n1 + 1/n2))
-z_stat = (p1 - p2) / se
-p_value_z = 1 - stats.norm.cdf(z_stat)
+average_age = level_mean(cube, 'Age')
+df_clean['Age_Group'] = age_groups(df_clean['Age'], average_age)
+
+split = age_split(cube, average_age)
+x1, n1 = split['Below Average']
+x2, n2 = split['Above Average']
+z_test = two_proportion_z(x1, n1, x2, n2)
+p1, p2 = z_test['p1'], z_test['p2']
+p_pooled, se, z_stat = z_test['p_pooled'], z_test['se'], z_test['z']
+p_value_z = z_test['p']
 
 # Proportions Table
 prop_data = [
@@ -3,15 +3,19 @@ Online Course Completion Analysis
 Statistical Tests and Visualizations
 """
 
+import sys
 import pandas as pd
-import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-from scipy import stats
-from scipy.stats import chi2_contingency, f_oneway, ttest_ind, ttest_1samp
+from scipy.stats import chi2_contingency
 import warnings
 warnings.filterwarnings('ignore')
 
+from data_loader import load_data, age_groups, validate
+from accumulators import DEFAULT_WORKERS
+from sufficient_stats import (build_cube, marginal, overall, counts, level_mean, age_split,
+                              two_sample_t, one_sample_t, one_way_anova, two_proportion_z)
+
 # Set style for better-looking plots
 sns.set_style("whitegrid")
 plt.rcParams['figure.figsize'] = (12, 6)
@@ -24,17 +28,39 @@ print("="*80)
 print("ONLINE COURSE COMPLETION ANALYSIS")
 print("="*80)
 
-# Load data
-df = pd.read_csv('scenario_6_Online_Course_Completion.xlsx.csv')
+# `--workers N` shards the grouped summaries over N forked worker processes
+n_workers = int(sys.argv[sys.argv.index('--workers') + 1]) if '--workers' in sys.argv else DEFAULT_WORKERS
+
+# Streaming mode (`python main.py --stream`): exports too large for memory are
+# read in chunks and Tests 2-6 come from bounded-memory accumulators (no plots).
+# `--bootstrap N` folds an N-replicate Poisson bootstrap into the same pass.
+if '--stream' in sys.argv[1:]:
+    from streaming import stream_summary, print_streaming_report
+    n_bootstrap = int(sys.argv[sys.argv.index('--bootstrap') + 1]) if '--bootstrap' in sys.argv else 0
+    print_streaming_report(stream_summary(n_bootstrap=n_bootstrap))
+    sys.exit(0)
+
+# Segment scan mode (`python main.py --segments`): Tests 2, 4 and 5 in every
+# Course_Type x Device_Used x age band slice, written to one results table
+if '--segments' in sys.argv[1:]:
+    from segment_scan import scan_segments, print_segment_report
+    print_segment_report(scan_segments(n_workers=n_workers))
+    sys.exit(0)
+
+# Load data (parsed once, then served from the cached snapshot)
+df, df_clean = load_data()
 print(f"\nOriginal dataset: {len(df)} rows")
 
-# Check for negative time values
-negative_time_count = (df['Time_Spent_Hours'] < 0).sum()
+# Check the validation rules (the loader drops every flagged row)
+validation = validate(df)
+negative_time_count = validation.counts['negative_time']
 print(f"Negative time values found: {negative_time_count}")
+other_violations = validation.counts.drop('negative_time')
+for rule, count in other_violations[other_violations > 0].items():
+    print(f"Rows failing {rule}: {count}")
 
-# Clean data - remove negative time values
-df_clean = df[df['Time_Spent_Hours'] >= 0].copy()
-print(f"After removing negative values: {len(df_clean)} rows")
+# Clean data - rows failing any rule are removed by the loader
+print(f"After removing rows that fail validation: {len(df_clean)} rows")
 print(f"Rows removed: {len(df) - len(df_clean)}")
 
 print("\n" + "="*80)
@@ -45,6 +71,10 @@ print(f"\nCompletion Status Distribution:\n{df_clean['Completed'].value_counts()
 print(f"\nCourse Type Distribution:\n{df_clean['Course_Type'].value_counts()}")
 print(f"\nDevice Used Distribution:\n{df_clean['Device_Used'].value_counts()}")
 
+# One grouped pass: per-cell n/mean/M2 over Completed x Course_Type x Device_Used x Age.
+# Tests 2, 3, 5 and 6 below are computed from these aggregates alone.
+cube = build_cube(df_clean, n_workers=n_workers)
+
 # ============================================================================
 # TEST 2: COMPARE TIME SPENT BY COMPLETION STATUS (Two-Sample T-Test)
 # ============================================================================
@@ -54,22 +84,23 @@ print("TEST 2: COMPARE TIME SPENT BY COMPLETION STATUS")
 print("Two-Sample T-Test")
 print("="*80)
 
-# Separate data by completion status
-time_completed = df_clean[df_clean['Completed'] == 'Yes']['Time_Spent_Hours']
-time_not_completed = df_clean[df_clean['Completed'] == 'No']['Time_Spent_Hours']
+# Group statistics by completion status
+by_completed = marginal(cube, by='Completed')
+stats_completed = by_completed.loc['Yes']
+stats_not_completed = by_completed.loc['No']
 
 print(f"\nCompleted Courses (Yes):")
-print(f"  N = {len(time_completed)}")
-print(f"  Mean = {time_completed.mean():.2f} hours")
-print(f"  Std Dev = {time_completed.std():.2f} hours")
+print(f"  N = {stats_completed['n']:.0f}")
+print(f"  Mean = {stats_completed['mean']:.2f} hours")
+print(f"  Std Dev = {stats_completed['std']:.2f} hours")
 
 print(f"\nNot Completed Courses (No):")
-print(f"  N = {len(time_not_completed)}")
-print(f"  Mean = {time_not_completed.mean():.2f} hours")
-print(f"  Std Dev = {time_not_completed.std():.2f} hours")
+print(f"  N = {stats_not_completed['n']:.0f}")
+print(f"  Mean = {stats_not_completed['mean']:.2f} hours")
+print(f"  Std Dev = {stats_not_completed['std']:.2f} hours")
 
 # Perform two-sample t-test
-t_stat, p_value = ttest_ind(time_completed, time_not_completed)
+t_stat, p_value = two_sample_t(stats_completed, stats_not_completed)
 
 print(f"\nHypothesis Test:")
 print(f"  H0: μ_completed = μ_not_completed (no difference in mean time spent)")
@@ -88,6 +119,8 @@ else:
     print(f"  between completed and not completed courses.")
 
 # Visualization for Test 2
+time_completed = df_clean[df_clean['Completed'] == 'Yes']['Time_Spent_Hours']
+time_not_completed = df_clean[df_clean['Completed'] == 'No']['Time_Spent_Hours']
 fig, axes = plt.subplots(1, 2, figsize=(14, 5))
 
 # Box plot
@@ -123,16 +156,17 @@ print("One-Sample T-Test")
 print("="*80)
 
 hypothesized_mean = 15.0  # From previous study
-time_spent_all = df_clean['Time_Spent_Hours']
+stats_all = overall(cube)
+sample_mean = stats_all['mean']
 
 print(f"\nSample Statistics:")
-print(f"  N = {len(time_spent_all)}")
-print(f"  Sample Mean = {time_spent_all.mean():.2f} hours")
-print(f"  Sample Std Dev = {time_spent_all.std():.2f} hours")
+print(f"  N = {stats_all['n']:.0f}")
+print(f"  Sample Mean = {sample_mean:.2f} hours")
+print(f"  Sample Std Dev = {stats_all['std']:.2f} hours")
 print(f"  Hypothesized Mean (from previous study) = {hypothesized_mean} hours")
 
 # Perform one-sample t-test (one-tailed: greater than)
-t_stat_one, p_value_two_tailed = ttest_1samp(time_spent_all, hypothesized_mean)
+t_stat_one, p_value_two_tailed = one_sample_t(stats_all, hypothesized_mean)
 p_value_one_tailed = p_value_two_tailed / 2 if t_stat_one > 0 else 1 - (p_value_two_tailed / 2)
 
 print(f"\nHypothesis Test:")
@@ -144,7 +178,7 @@ print(f"  Significance level α = 0.05")
 
 if p_value_one_tailed < 0.05:
     print(f"\n  Decision: REJECT H0 (p-value = {p_value_one_tailed:.4f} < 0.05)")
-    print(f"  Interpretation: The average time spent ({time_spent_all.mean():.2f} hours)")
+    print(f"  Interpretation: The average time spent ({sample_mean:.2f} hours)")
     print(f"  significantly EXCEEDS 15 hours at the 5% significance level.")
     print(f"  This represents an increase from the previous study's finding.")
 else:
@@ -153,12 +187,13 @@ else:
     print(f"  the average time spent exceeds 15 hours.")
 
 # Visualization for Test 3
+time_spent_all = df_clean['Time_Spent_Hours']
 fig, axes = plt.subplots(1, 2, figsize=(14, 5))
 
 # Histogram with vertical lines
 axes[0].hist(time_spent_all, bins=30, edgecolor='black', alpha=0.7, color='skyblue')
-axes[0].axvline(time_spent_all.mean(), color='red', linestyle='--', linewidth=2, 
-                label=f'Sample Mean = {time_spent_all.mean():.2f}')
+axes[0].axvline(sample_mean, color='red', linestyle='--', linewidth=2, 
+                label=f'Sample Mean = {sample_mean:.2f}')
 axes[0].axvline(hypothesized_mean, color='green', linestyle='--', linewidth=2, 
                 label=f'Hypothesized Mean = {hypothesized_mean}')
 axes[0].set_xlabel('Time Spent (Hours)', fontsize=12)
@@ -172,8 +207,8 @@ axes[0].grid(True, alpha=0.3)
 axes[1].boxplot(time_spent_all, vert=True)
 axes[1].axhline(hypothesized_mean, color='green', linestyle='--', linewidth=2, 
                 label=f'Hypothesized Mean = {hypothesized_mean}')
-axes[1].axhline(time_spent_all.mean(), color='red', linestyle='--', linewidth=2, 
-                label=f'Sample Mean = {time_spent_all.mean():.2f}')
+axes[1].axhline(sample_mean, color='red', linestyle='--', linewidth=2, 
+                label=f'Sample Mean = {sample_mean:.2f}')
 axes[1].set_ylabel('Time Spent (Hours)', fontsize=12)
 axes[1].set_title('Time Spent Distribution\n(Box Plot with Reference)', 
                   fontsize=14, fontweight='bold')
@@ -195,8 +230,8 @@ print("TEST 4: COMPARE COURSE TYPE BY COMPLETION STATUS")
 print("Chi-Squared Test of Independence")
 print("="*80)
 
-# Create contingency table
-contingency_table = pd.crosstab(df_clean['Course_Type'], df_clean['Completed'])
+# Contingency table from the cube counts
+contingency_table = counts(cube, 'Course_Type', 'Completed')
 print(f"\nContingency Table (Observed Frequencies):")
 print(contingency_table)
 
@@ -271,25 +306,20 @@ print("TEST 5: COMPARE DEVICE USED BY TIME SPENT")
 print("One-Way ANOVA")
 print("="*80)
 
-# Separate data by device
-time_by_device = {
-    'Desktop': df_clean[df_clean['Device_Used'] == 'Desktop']['Time_Spent_Hours'],
-    'Mobile': df_clean[df_clean['Device_Used'] == 'Mobile']['Time_Spent_Hours'],
-    'Tablet': df_clean[df_clean['Device_Used'] == 'Tablet']['Time_Spent_Hours']
-}
+# Group statistics by device
+by_device = marginal(cube, by='Device_Used')
 
 print(f"\nDescriptive Statistics by Device:")
-for device, times in time_by_device.items():
+for device, group in by_device.iterrows():
     print(f"\n{device}:")
-    print(f"  N = {len(times)}")
-    print(f"  Mean = {times.mean():.2f} hours")
-    print(f"  Std Dev = {times.std():.2f} hours")
-    print(f"  Min = {times.min():.2f}, Max = {times.max():.2f}")
+    print(f"  N = {group['n']:.0f}")
+    print(f"  Mean = {group['mean']:.2f} hours")
+    print(f"  Std Dev = {group['std']:.2f} hours")
+    print(f"  Min = {group['min']:.2f}, Max = {group['max']:.2f}")
 
 # Perform one-way ANOVA
-f_stat, p_value_anova = f_oneway(time_by_device['Desktop'], 
-                                  time_by_device['Mobile'], 
-                                  time_by_device['Tablet'])
+anova = one_way_anova(by_device)
+f_stat, p_value_anova = anova['F'], anova['p']
 
 print(f"\nHypothesis Test:")
 print(f"  H0: μ_Desktop = μ_Mobile = μ_Tablet (all devices have equal mean time)")
@@ -309,6 +339,11 @@ else:
     print(f"  across different devices. Device type does not affect time spent.")
 
 # Visualization for Test 5
+time_by_device = {
+    'Desktop': df_clean[df_clean['Device_Used'] == 'Desktop']['Time_Spent_Hours'],
+    'Mobile': df_clean[df_clean['Device_Used'] == 'Mobile']['Time_Spent_Hours'],
+    'Tablet': df_clean[df_clean['Device_Used'] == 'Tablet']['Time_Spent_Hours']
+}
 fig, axes = plt.subplots(1, 2, figsize=(14, 5))
 
 # Box plot by device
@@ -334,7 +369,7 @@ axes[1].grid(True, alpha=0.3)
 
 # Add mean values as text
 for i, device in enumerate(devices_list):
-    mean_val = time_by_device[device].mean()
+    mean_val = by_device.loc[device, 'mean']
     axes[1].text(positions[i], mean_val, f'{mean_val:.1f}', 
                 ha='center', va='bottom', fontweight='bold', fontsize=9)
 
@@ -354,20 +389,16 @@ print("Two-Sample Proportion Z-Test")
 print("="*80)
 
 # Calculate average age
-average_age = df_clean['Age'].mean()
+average_age = level_mean(cube, 'Age')
 print(f"\nAverage Age: {average_age:.2f} years")
 
 # Create age groups
-df_clean['Age_Group'] = df_clean['Age'].apply(lambda x: 'Below Average' if x < average_age else 'Above Average')
-
-# Calculate completion proportions for each age group
-below_avg = df_clean[df_clean['Age_Group'] == 'Below Average']
-above_avg = df_clean[df_clean['Age_Group'] == 'Above Average']
+df_clean['Age_Group'] = age_groups(df_clean['Age'], average_age)
 
-n1 = len(below_avg)
-n2 = len(above_avg)
-x1 = (below_avg['Completed'] == 'Yes').sum()
-x2 = (above_avg['Completed'] == 'Yes').sum()
+# Completion counts for each age group, read from the cube
+split = age_split(cube, average_age)
+x1, n1 = split['Below Average']
+x2, n2 = split['Above Average']
 p1 = x1 / n1
 p2 = x2 / n2
 
@@ -382,10 +413,9 @@ print(f"  Completed = {x2}")
 print(f"  Completion Rate = {p2:.4f} ({p2*100:.2f}%)")
 
 # Two-sample proportion z-test
-p_pooled = (x1 + x2) / (n1 + n2)
-se = np.sqrt(p_pooled * (1 - p_pooled) * (1/n1 + 1/n2))
-z_stat = (p1 - p2) / se
-p_value_z = 1 - stats.norm.cdf(z_stat)  # One-tailed test (greater than)
+z_test = two_proportion_z(x1, n1, x2, n2)
+p_pooled, se, z_stat = z_test['p_pooled'], z_test['se'], z_test['z']
+p_value_z = z_test['p']  # One-tailed test (greater than)
 
 print(f"\nHypothesis Test:")
 print(f"  H0: p_below ≤ p_above (below average age does NOT have higher completion rate)")
@@ -465,7 +495,7 @@ print(f"""
 3. Average Time Exceeds 15 Hours (One-Sample T-Test):
    - Result: {"REJECT H0" if p_value_one_tailed < 0.05 else "FAIL TO REJECT H0"}
    - p-value: {p_value_one_tailed:.4f}
-   - Sample mean: {time_spent_all.mean():.2f} hours
+   - Sample mean: {sample_mean:.2f} hours
    - Conclusion: {"Average significantly exceeds 15 hours" if p_value_one_tailed < 0.05 else "No significant evidence that average "
    "exceeds 15 hours"}
 
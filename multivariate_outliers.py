@@ -0,0 +1,129 @@
+"""
+Multivariate Outlier Detection
+Robust Mahalanobis distance of time and age within each Completed x Course_Type x Device_Used cell
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+from scipy.linalg import solve_triangular
+
+from accumulators import key_codes, cell_codes
+from resampling import DEFAULT_SEED
+
+NUMERIC_FEATURES = ['Time_Spent_Hours', 'Age']
+CELL_KEYS = ['Completed', 'Course_Type', 'Device_Used']
+CUTOFF_QUANTILE = 0.975  # chi-squared quantile of the squared distance that flags a row
+MCD_SUPPORT = 0.75  # share of rows the robust scatter is fitted on
+MCD_MAX_ROWS = 20_000  # the fit uses a random subsample this large; scoring covers every row
+MCD_STARTS = 10
+MCD_STEPS = 20
+
+
+# ============================================================================
+# ROBUST LOCATION AND SCATTER
+# ============================================================================
+
+def cell_residuals(df, features=NUMERIC_FEATURES, keys=CELL_KEYS):
+    """Numeric features minus the median of their categorical cell.
+
+    Centring on the cell median makes a value that is ordinary overall but
+    unusual for its course/device/completion combination stand out.
+    """
+    codes, levels = key_codes(df, keys)
+    cells = cell_codes(codes, tuple(len(level) for level in levels))
+    values = df[features].to_numpy(dtype=np.float64)
+    medians = pd.DataFrame(values).groupby(cells).median()
+    centre = np.full((len(cells), len(features)), np.nan)
+    known = cells >= 0
+    centre[known] = medians.reindex(cells[known]).to_numpy()
+    return values - centre, cells
+
+
+def _squared_distances(x, location, scatter):
+    chol = np.linalg.cholesky(scatter)
+    z = solve_triangular(chol, (x - location).T, lower=True)
+    return np.einsum('ij,ij->j', z, z)
+
+
+def _consistency(quantile, p):
+    """Scale that makes the covariance of the central `quantile` share unbiased under normality."""
+    return quantile / stats.chi2.cdf(stats.chi2.ppf(quantile, p), p + 2)
+
+
+def robust_scatter(x, support=MCD_SUPPORT, n_starts=MCD_STARTS, n_steps=MCD_STEPS, seed=DEFAULT_SEED):
+    """Reweighted minimum covariance determinant estimate (FastMCD C-steps).
+
+    Each start fits p + 1 random rows, then repeatedly refits on the h rows
+    closest to the current estimate; the lowest-determinant fit wins and is
+    reweighted at the CUTOFF_QUANTILE distance.
+    """
+    n, p = x.shape
+    h = int(np.ceil(support * n))
+    rng = np.random.default_rng(seed)
+
+    best = (np.inf, None, None)
+    for _ in range(n_starts):
+        subset = x[rng.choice(n, size=p + 1, replace=False)]
+        location, scatter = subset.mean(axis=0), np.cov(subset, rowvar=False)
+        for _ in range(n_steps):
+            if np.linalg.det(scatter) <= 0:
+                break
+            keep = np.argpartition(_squared_distances(x, location, scatter), h - 1)[:h]
+            new_location, new_scatter = x[keep].mean(axis=0), np.cov(x[keep], rowvar=False)
+            converged = np.isclose(np.linalg.det(new_scatter), np.linalg.det(scatter))
+            location, scatter = new_location, new_scatter
+            if converged:
+                break
+        det = np.linalg.det(scatter)
+        if 0 < det < best[0]:
+            best = (det, location, scatter)
+
+    _, location, scatter = best
+    if location is None:
+        raise ValueError("robust scatter is singular; the features have too few distinct values")
+    scatter = scatter * _consistency(support, p)
+
+    # One reweighting step restores efficiency lost to the h-subset fit
+    inliers = _squared_distances(x, location, scatter) <= stats.chi2.ppf(CUTOFF_QUANTILE, p)
+    location, scatter = x[inliers].mean(axis=0), np.cov(x[inliers], rowvar=False)
+    return location, scatter * _consistency(CUTOFF_QUANTILE, p)
+
+
+# ============================================================================
+# SCORING
+# ============================================================================
+
+def mahalanobis_outliers(df, features=NUMERIC_FEATURES, keys=CELL_KEYS, max_fit_rows=MCD_MAX_ROWS,
+                         seed=DEFAULT_SEED):
+    """Robust squared distance, tail p-value and outlier flag for every row.
+
+    The scatter is fitted on at most `max_fit_rows` residuals; scoring is one
+    triangular solve over all rows, so cost grows linearly with the data.
+    """
+    residuals, cells = cell_residuals(df, features, keys)
+    known = np.flatnonzero(~np.isnan(residuals).any(axis=1))
+    rng = np.random.default_rng(seed)
+    fit_rows = known if len(known) <= max_fit_rows else rng.choice(known, size=max_fit_rows, replace=False)
+    location, scatter = robust_scatter(residuals[fit_rows], seed=rng)
+
+    distance = np.full(len(df), np.nan)
+    distance[known] = _squared_distances(residuals[known], location, scatter)
+    p = len(features)
+    scores = pd.DataFrame({'distance': distance, 'p_value': stats.chi2.sf(distance, p)}, index=df.index)
+    scores['outlier'] = distance > stats.chi2.ppf(CUTOFF_QUANTILE, p)
+    for column, feature in enumerate(features):
+        scores[f'{feature}_residual'] = residuals[:, column]
+    return scores, location, scatter
+
+
+def print_multivariate_report(df, scores, top=10):
+    flagged = scores[scores['outlier']]
+    print(f"\nCutoff: squared distance > {stats.chi2.ppf(CUTOFF_QUANTILE, len(NUMERIC_FEATURES)):.2f} "
+          f"(chi-squared {CUTOFF_QUANTILE} quantile, {len(NUMERIC_FEATURES)} df)")
+    print(f"Joint outliers detected: {len(flagged)} ({len(flagged)/len(scores)*100:.2f}%)")
+    if len(flagged) > 0:
+        rows = df.loc[flagged.index, ['User_ID'] + NUMERIC_FEATURES + CELL_KEYS].join(flagged['distance'])
+        print(f"\nMost extreme (top {top}):")
+        print(rows.nlargest(top, 'distance').to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+    return flagged
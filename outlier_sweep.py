@@ -0,0 +1,136 @@
+"""
+Outlier Threshold Sweep
+Re-runs the Test 2 t-test and Test 5 ANOVA for many IQR fences and z cutoffs from sorted prefix sums
+"""
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+from scipy import stats
+
+VALUE = 'Time_Spent_Hours'
+IQR_MULTIPLIERS = np.round(np.arange(0.5, 3.01, 0.1), 2)
+Z_CUTOFFS = np.round(np.arange(1.5, 4.01, 0.1), 2)
+OUTPUT_FILE = 'outlier_threshold_sweep.csv'
+PLOT_FILE = 'outlier_threshold_sweep.png'
+
+
+# ============================================================================
+# SORTED PREFIX SUMS
+# ============================================================================
+
+class SortedGroups:
+    """Values sorted once per group, with prefix sums and prefix sums of squares.
+
+    n, mean and M2 of any value window [lower, upper] then cost two binary
+    searches per group, for a whole array of windows at once.
+    """
+
+    def __init__(self, values, codes, k):
+        values = np.asarray(values, dtype=np.float64)
+        codes = np.asarray(codes)
+        self.shift = values.mean()  # centring keeps the prefix sums of squares accurate
+        self.sorted, self.prefix, self.prefix_sq = [], [], []
+        for g in range(k):
+            group = np.sort(values[codes == g] - self.shift)
+            self.sorted.append(group)
+            self.prefix.append(np.concatenate([[0.0], np.cumsum(group)]))
+            self.prefix_sq.append(np.concatenate([[0.0], np.cumsum(group * group)]))
+
+    def window(self, lower, upper):
+        """(n, mean, m2) arrays of shape (groups, windows) for values within [lower, upper]."""
+        lower = np.asarray(lower, dtype=np.float64) - self.shift
+        upper = np.asarray(upper, dtype=np.float64) - self.shift
+        n, total, total_sq = [], [], []
+        for group, prefix, prefix_sq in zip(self.sorted, self.prefix, self.prefix_sq):
+            lo = np.searchsorted(group, lower, side='left')
+            hi = np.searchsorted(group, upper, side='right')
+            n.append(hi - lo)
+            total.append(prefix[hi] - prefix[lo])
+            total_sq.append(prefix_sq[hi] - prefix_sq[lo])
+        n, total, total_sq = np.array(n, dtype=np.float64), np.array(total), np.array(total_sq)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return n, self.shift + total / n, total_sq - total ** 2 / n
+
+
+# ============================================================================
+# VECTORIZED TESTS PER WINDOW
+# ============================================================================
+
+def pooled_t(n, mean, m2):
+    """Pooled two-sample t (group 1 - group 0) for every window column."""
+    df_within = n[0] + n[1] - 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pooled_var = (m2[0] + m2[1]) / df_within
+        t_stat = (mean[1] - mean[0]) / np.sqrt(pooled_var * (1 / n[0] + 1 / n[1]))
+    return t_stat, 2 * stats.t.sf(np.abs(t_stat), df_within)
+
+
+def anova_f(n, mean, m2):
+    """One-way ANOVA F across the group rows for every window column."""
+    k, total = n.shape[0], n.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        grand_mean = np.nansum(n * mean, axis=0) / total
+        ss_between = np.nansum(n * (mean - grand_mean) ** 2, axis=0)
+        f_stat = (ss_between / (k - 1)) / (np.nansum(m2, axis=0) / (total - k))
+    return f_stat, stats.f.sf(f_stat, k - 1, total - k)
+
+
+# ============================================================================
+# SWEEP
+# ============================================================================
+
+def threshold_sweep(df, iqr_multipliers=IQR_MULTIPLIERS, z_cutoffs=Z_CUTOFFS, value=VALUE):
+    """Test 2 t and Test 5 F after removing values outside each fence.
+
+    Fences come from the whole column, as in Robustness Check 4:
+    Q1 - m*IQR .. Q3 + m*IQR, and mean -/+ z*SD (population SD, as scipy's zscore).
+    """
+    values = df[value].to_numpy(dtype=np.float64)
+    q1, q3 = np.quantile(values, [0.25, 0.75])
+    iqr = q3 - q1
+    centre, sd = values.mean(), values.std()
+
+    rules = pd.DataFrame({
+        'rule': ['IQR'] * len(iqr_multipliers) + ['z-score'] * len(z_cutoffs),
+        'threshold': np.concatenate([iqr_multipliers, z_cutoffs]),
+        'lower': np.concatenate([q1 - np.asarray(iqr_multipliers) * iqr, centre - np.asarray(z_cutoffs) * sd]),
+        'upper': np.concatenate([q3 + np.asarray(iqr_multipliers) * iqr, centre + np.asarray(z_cutoffs) * sd]),
+    })
+
+    by_completed = SortedGroups(values, df['Completed'].cat.codes.to_numpy(), 2)
+    n, mean, m2 = by_completed.window(rules['lower'], rules['upper'])
+    rules['n_kept'] = n.sum(axis=0).astype(int)
+    rules['n_removed'] = len(values) - rules['n_kept']
+    rules['t_statistic'], rules['t_p_value'] = pooled_t(n, mean, m2)
+
+    devices = df['Device_Used'].cat
+    by_device = SortedGroups(values, devices.codes.to_numpy(), len(devices.categories))
+    rules['F_statistic'], rules['F_p_value'] = anova_f(*by_device.window(rules['lower'], rules['upper']))
+    return rules
+
+
+def plot_sweep(sweep, plot_file=PLOT_FILE, alpha=0.05):
+    fig, axes = plt.subplots(2, 2, figsize=(14, 9))
+    fig.suptitle('Test Statistics vs Outlier Threshold', fontsize=16, fontweight='bold')
+
+    for row, (rule, xlabel) in enumerate([('IQR', 'IQR fence multiplier'), ('z-score', '|z| cutoff')]):
+        rows = sweep[sweep['rule'] == rule]
+        axes[row, 0].plot(rows['threshold'], rows['t_statistic'], 'o-', color='steelblue', label='t (Test 2)')
+        axes[row, 0].plot(rows['threshold'], rows['F_statistic'], 's-', color='darkorange', label='F (Test 5)')
+        axes[row, 0].set_ylabel('Statistic')
+        axes[row, 1].plot(rows['threshold'], rows['t_p_value'], 'o-', color='steelblue', label='t-test p')
+        axes[row, 1].plot(rows['threshold'], rows['F_p_value'], 's-', color='darkorange', label='ANOVA p')
+        axes[row, 1].axhline(alpha, color='red', linestyle='--', linewidth=2, label=f'α = {alpha}')
+        axes[row, 1].set_ylabel('p-value')
+        axes[row, 1].set_ylim([0, 1])
+        for ax in axes[row]:
+            ax.set_xlabel(xlabel)
+            ax.set_title(f'{rule} rule', fontweight='bold')
+            ax.grid(True, alpha=0.3)
+            ax.legend()
+
+    plt.tight_layout()
+    plt.savefig(plot_file, dpi=300, bbox_inches='tight')
+    plt.close()
+    return plot_file
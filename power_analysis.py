@@ -0,0 +1,175 @@
+"""
+Monte Carlo Power Analysis
+Simulated power curves for the five study tests over a grid of sample and effect sizes
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from data_loader import load_clean_data, completed_flag
+from resampling import DEFAULT_SEED, MEMORY_BUDGET, block_size, spawn_streams, chi_squared_statistic
+from sufficient_stats import two_sample_t, one_sample_t, two_proportion_z
+
+ALPHA = 0.05
+N_REPLICATES = 2000
+HYPOTHESIZED_MEAN = 15.0
+SAMPLE_SIZES = [100, 250, 500, 1000, 2000, 5000]
+OUTPUT_FILE = 'power_curves.csv'
+
+# Effect grid per test: (metric, values); zero effect gives the simulated type I error
+EFFECT_GRID = {
+    'Test 2 (two-sample t)': ("Cohen's d", [0.0, 0.1, 0.2, 0.3, 0.5]),
+    'Test 3 (one-sample t)': ("Cohen's d", [0.0, 0.05, 0.1, 0.2, 0.3]),
+    'Test 4 (chi-squared)': ('completion rate spread', [0.0, 0.05, 0.1, 0.15, 0.2]),
+    'Test 5 (ANOVA)': ("Cohen's f", [0.0, 0.05, 0.1, 0.15, 0.25]),
+    'Test 6 (proportion z)': ('completion rate difference', [0.0, 0.05, 0.1, 0.15, 0.2]),
+}
+
+
+# ============================================================================
+# POPULATION MODEL
+# ============================================================================
+
+def study_parameters(df):
+    """Empirical population the replicates are drawn from.
+
+    Times are resampled from the observed (mean-centred) distribution so the
+    simulation keeps its real shape; effects are added as shifts on top.
+    """
+    time = df['Time_Spent_Hours'].to_numpy(dtype=np.float64)
+    completed = completed_flag(df['Completed']).to_numpy()
+    return {
+        'centred_time': time - time.mean(),
+        'sd': time.std(ddof=1),
+        'completion_rate': completed.mean(),
+        'course_probs': df['Course_Type'].value_counts(normalize=True, sort=False).to_numpy(),
+        'device_probs': df['Device_Used'].value_counts(normalize=True, sort=False).to_numpy(),
+        'p_below_age': (df['Age'] < df['Age'].mean()).mean(),
+    }
+
+
+def _sample_moments(values, rng, n_replicates, size, memory_budget=MEMORY_BUDGET):
+    """Per-replicate (mean, std) of `size` draws from `values`, built in memory-bounded blocks."""
+    total, sumsq = np.empty(n_replicates), np.empty(n_replicates)
+    block = block_size(size, n_replicates, memory_budget)
+    for lo in range(0, n_replicates, block):
+        rows = min(block, n_replicates - lo)
+        draws = values[rng.integers(0, len(values), size=(rows, size))]
+        total[lo:lo + rows] = draws.sum(axis=-1)
+        sumsq[lo:lo + rows] = np.einsum('ij,ij->i', draws, draws)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return total / size, np.sqrt((sumsq - total ** 2 / size) / (size - 1))
+
+
+def _split(n, probs):
+    """Fixed group sizes for a total n (largest remainder rounding)."""
+    sizes = np.floor(n * np.asarray(probs)).astype(int)
+    sizes[np.argsort(n * np.asarray(probs) - sizes)[::-1][:n - sizes.sum()]] += 1
+    return sizes
+
+
+# ============================================================================
+# VECTORIZED REPLICATES (one p-value per replicate)
+# ============================================================================
+
+def simulate_two_sample_t(params, n, effect, n_replicates, rng):
+    n1, n2 = _split(n, [params['completion_rate'], 1 - params['completion_rate']])
+    mean1, std1 = _sample_moments(params['centred_time'], rng, n_replicates, n1)
+    mean2, std2 = _sample_moments(params['centred_time'], rng, n_replicates, n2)
+    group1 = {'n': n1, 'mean': mean1 + effect * params['sd'], 'std': std1}
+    return two_sample_t(group1, {'n': n2, 'mean': mean2, 'std': std2})[1]
+
+
+def simulate_one_sample_t(params, n, effect, n_replicates, rng):
+    mean, std = _sample_moments(params['centred_time'], rng, n_replicates, n)
+    group = {'n': n, 'mean': HYPOTHESIZED_MEAN + effect * params['sd'] + mean, 'std': std}
+    t_stat, p_two = one_sample_t(group, HYPOTHESIZED_MEAN)
+    return np.where(t_stat > 0, p_two / 2, 1 - p_two / 2)
+
+
+def simulate_chi_squared(params, n, effect, n_replicates, rng):
+    """Course x Completed tables; completion rates spread by `effect` across the courses."""
+    course_counts = rng.multinomial(n, params['course_probs'], size=n_replicates)
+    rates = params['completion_rate'] + effect * np.linspace(-0.5, 0.5, len(params['course_probs']))
+    yes = rng.binomial(course_counts, np.clip(rates, 0, 1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        chi2_stat = chi_squared_statistic(np.stack([course_counts - yes, yes], axis=-1))
+    return stats.chi2.sf(chi2_stat, len(params['course_probs']) - 1)
+
+
+def simulate_anova(params, n, effect, n_replicates, rng):
+    """Device groups whose means are spread so the between-group SD is effect * sd."""
+    sizes = _split(n, params['device_probs'])
+    k = len(sizes)
+    offsets = np.linspace(-1, 1, k)
+    offsets *= effect * params['sd'] / offsets.std()
+    means, m2 = np.empty((k, n_replicates)), np.empty((k, n_replicates))
+    for g, (size, offset) in enumerate(zip(sizes, offsets)):
+        mean, std = _sample_moments(params['centred_time'], rng, n_replicates, size)
+        means[g], m2[g] = mean + offset, std ** 2 * (size - 1)
+
+    sizes = sizes[:, None]
+    grand_mean = (sizes * means).sum(axis=0) / n
+    ss_between = (sizes * (means - grand_mean) ** 2).sum(axis=0)
+    f_stat = (ss_between / (k - 1)) / (m2.sum(axis=0) / (n - k))
+    return stats.f.sf(f_stat, k - 1, n - k)
+
+
+def simulate_proportion_z(params, n, effect, n_replicates, rng):
+    n1, n2 = _split(n, [params['p_below_age'], 1 - params['p_below_age']])
+    rate = params['completion_rate']
+    x1 = rng.binomial(n1, np.clip(rate + effect / 2, 0, 1), size=n_replicates)
+    x2 = rng.binomial(n2, np.clip(rate - effect / 2, 0, 1), size=n_replicates)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return two_proportion_z(x1, n1, x2, n2)['p']
+
+
+SIMULATORS = {
+    'Test 2 (two-sample t)': simulate_two_sample_t,
+    'Test 3 (one-sample t)': simulate_one_sample_t,
+    'Test 4 (chi-squared)': simulate_chi_squared,
+    'Test 5 (ANOVA)': simulate_anova,
+    'Test 6 (proportion z)': simulate_proportion_z,
+}
+
+
+# ============================================================================
+# POWER CURVES
+# ============================================================================
+
+def power_curves(df=None, sample_sizes=SAMPLE_SIZES, effect_grid=EFFECT_GRID, n_replicates=N_REPLICATES,
+                 alpha=ALPHA, seed=DEFAULT_SEED):
+    """Long table of simulated power (share of replicates with p < alpha) per test, effect and n."""
+    params = study_parameters(load_clean_data() if df is None else df)
+    grid = [(test, metric, effect, n) for test, (metric, effects) in effect_grid.items()
+            for effect in effects for n in sample_sizes]
+    streams = spawn_streams(seed, len(grid))
+
+    rows = []
+    for (test, metric, effect, n), rng in zip(grid, streams):
+        p_values = SIMULATORS[test](params, n, effect, n_replicates, rng)
+        power = np.mean(p_values < alpha)
+        rows.append({'test': test, 'effect_metric': metric, 'effect': effect, 'n': n, 'power': power,
+                     'mc_se': np.sqrt(power * (1 - power) / n_replicates)})
+    return pd.DataFrame(rows)
+
+
+def print_power_report(curves, output_file=OUTPUT_FILE):
+    print("\n" + "="*80)
+    print(f"MONTE CARLO POWER ANALYSIS (alpha = {ALPHA}, {N_REPLICATES} replicates per point)")
+    print("="*80)
+
+    for test, rows in curves.groupby('test', sort=False):
+        print(f"\n{test} - effect size: {rows['effect_metric'].iloc[0]}")
+        print("-" * 80)
+        table = rows.pivot(index='effect', columns='n', values='power')
+        print(table.to_string(float_format=lambda value: f"{value:.3f}"))
+
+    curves.to_csv(output_file, index=False)
+    print(f"\n✓ Saved: {output_file}")
+    return curves
+
+
+if __name__ == '__main__':
+    print_power_report(power_curves())
@@ -0,0 +1,122 @@
+"""
+Rank Cache
+Sorts each column once and serves tie-aware ranks, group partitions and rank-based tests from it
+"""
+
+import numpy as np
+from scipy import stats
+
+
+# ============================================================================
+# RANK INDEX
+# ============================================================================
+
+class RankIndex:
+    """One stable sort of a column: sorted values, average ranks and tie sizes."""
+
+    def __init__(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.order = np.argsort(values, kind='stable')
+        self.sorted = values[self.order]
+        starts = np.flatnonzero(np.r_[True, self.sorted[1:] != self.sorted[:-1]])
+        self.tie_counts = np.diff(np.r_[starts, len(values)])
+        self.ranks = np.empty(len(values))
+        self.ranks[self.order] = np.repeat(starts + (self.tie_counts + 1) / 2, self.tie_counts)
+
+    def tie_term(self):
+        """sum(t^3 - t) over tie groups, shared by the rank-test tie corrections."""
+        t = self.tie_counts.astype(np.float64)
+        return float((t ** 3 - t).sum())
+
+
+class RankCache:
+    """Lazily built RankIndex per column, plus per-group partitions of the sorted values.
+
+    Spearman ranks, Mann-Whitney U, Kruskal-Wallis and Q-Q quantiles of the
+    same column all reuse the one sort.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self._indexes = {}
+        self._partitions = {}
+
+    def index(self, column):
+        if column not in self._indexes:
+            self._indexes[column] = RankIndex(self.df[column].to_numpy(dtype=np.float64))
+        return self._indexes[column]
+
+    def ranks(self, column):
+        return self.index(column).ranks
+
+    def sorted_groups(self, column, by):
+        """{level: sorted values} for each level of the categorical `by` (no re-sort)."""
+        key = (column, by)
+        if key not in self._partitions:
+            index = self.index(column)
+            labels = self.df[by].cat
+            codes = labels.codes.to_numpy()[index.order]
+            grouping = np.argsort(codes, kind='stable')  # integer keys: keeps value order inside groups
+            sizes = np.bincount(codes[codes >= 0], minlength=len(labels.categories))
+            parts = np.split(index.sorted[grouping][(codes < 0).sum():], np.cumsum(sizes)[:-1])
+            self._partitions[key] = dict(zip(labels.categories, parts))
+        return self._partitions[key]
+
+    def rank_sums(self, column, by):
+        """(levels, n per level, rank sum per level) of `column` ranked over all rows."""
+        labels = self.df[by].cat
+        codes = labels.codes.to_numpy()
+        known = codes >= 0
+        k = len(labels.categories)
+        n = np.bincount(codes[known], minlength=k)
+        sums = np.bincount(codes[known], weights=self.ranks(column)[known], minlength=k)
+        return list(labels.categories), n, sums
+
+    def mann_whitney(self, column, by, first, second):
+        """Two-sided Mann-Whitney U of `first` vs `second`; U is reported for `first`.
+
+        Matches scipy.stats.mannwhitneyu's asymptotic method with continuity
+        correction when `by` has exactly these two levels.
+        """
+        levels, n, sums = self.rank_sums(column, by)
+        n1, n2 = n[levels.index(first)], n[levels.index(second)]
+        u1 = sums[levels.index(first)] - n1 * (n1 + 1) / 2
+        u2 = n1 * n2 - u1
+        total = n1 + n2
+        sd = np.sqrt(n1 * n2 / 12 * ((total + 1) - self.index(column).tie_term() / (total * (total - 1))))
+        z = (max(u1, u2) - n1 * n2 / 2 - 0.5) / sd
+        return u1, min(1.0, 2 * stats.norm.sf(z))
+
+    def kruskal(self, column, by):
+        """Kruskal-Wallis H across the levels of `by`, with the tie correction."""
+        _, n, sums = self.rank_sums(column, by)
+        present = n > 0
+        total = n.sum()
+        h = 12 / (total * (total + 1)) * (sums[present] ** 2 / n[present]).sum() - 3 * (total + 1)
+        h /= 1 - self.index(column).tie_term() / (total ** 3 - total)
+        return h, stats.chi2.sf(h, present.sum() - 1)
+
+
+# ============================================================================
+# Q-Q PLOTS FROM SORTED VALUES
+# ============================================================================
+
+def normal_order_statistics(n):
+    """Filliben's estimate of normal order-statistic medians (as probplot)."""
+    uniform = np.empty(n)
+    uniform[-1] = 0.5 ** (1.0 / n)
+    uniform[0] = 1 - uniform[-1]
+    uniform[1:-1] = (np.arange(2, n) - 0.3175) / (n + 0.365)
+    return stats.norm.ppf(uniform)
+
+
+def qq_plot(ax, sorted_values):
+    """probplot(..., dist='norm', plot=ax) drawn from values that are already sorted."""
+    theoretical = normal_order_statistics(len(sorted_values))
+    slope, intercept = np.polyfit(theoretical, sorted_values, 1)
+    ax.plot(theoretical, sorted_values, 'bo')
+    ax.plot(theoretical, slope * theoretical + intercept, 'r-')
+    ax.set_title('Probability Plot')
+    ax.set_xlabel('Theoretical quantiles')
+    ax.set_ylabel('Ordered Values')
+    return slope, intercept
@@ -0,0 +1,138 @@
+"""
+Report Profile
+One bincount sweep over category codes that serves every count, rate and group summary of the anomalies report
+"""
+
+import numpy as np
+import pandas as pd
+
+from data_loader import (COMPLETED_LEVELS, COURSE_TYPES, DEVICES, AGE_LEVELS, AGE_BAND_EDGES,
+                         AGE_BAND_LEVELS)
+from accumulators import Moments, cell_codes, histogram_quantiles
+
+VALUE = 'Time_Spent_Hours'
+CATEGORY_KEYS = ['Completed', 'Course_Type', 'Device_Used']
+
+
+# ============================================================================
+# MOMENT CUBE HELPERS
+# ============================================================================
+
+def _arrays(moments):
+    return (moments.n, moments.mean, moments.m2, moments.m3, moments.m4, moments.min, moments.max)
+
+
+def _take(moments, index, axis):
+    return Moments(*(np.take(a, index, axis=axis) for a in _arrays(moments)))
+
+
+def _concat(parts, axis):
+    return Moments(*(np.concatenate(arrays, axis=axis) for arrays in zip(*map(_arrays, parts))))
+
+
+def fold(moments, axis):
+    """Merge all levels of one axis (kept with length 1) by pairwise halving."""
+    while moments.n.shape[axis] > 1:
+        size = moments.n.shape[axis]
+        half = size // 2
+        merged = _take(moments, range(half), axis) + _take(moments, range(half, 2 * half), axis)
+        moments = _concat([merged, _take(moments, [size - 1], axis)], axis) if size % 2 else merged
+    return moments
+
+
+def _sorted_quantiles(values, quantiles):
+    """Linear-interpolation quantiles (as pandas) of an already sorted array."""
+    position = (len(values) - 1) * np.asarray(quantiles, dtype=np.float64)
+    lower = np.floor(position).astype(int)
+    upper = np.minimum(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+# ============================================================================
+# PROFILE
+# ============================================================================
+
+class ReportProfile:
+    """Moments of the value over Completed x Course_Type x Device_Used x Age.
+
+    The cube is built in one bincount pass; the Age axis is also folded into
+    the age bands. Every table of the report is then a fold of the cube, so
+    adding a section costs nothing per row. Sorted values (overall and per
+    completion status) back the exact quantiles and tail counts.
+    """
+
+    def __init__(self, df, value=VALUE):
+        codes = [df[key].cat.codes.to_numpy() for key in CATEGORY_KEYS] + [df['Age'].to_numpy(dtype=np.intp)]
+        shape = (len(COMPLETED_LEVELS), len(COURSE_TYPES), len(DEVICES), AGE_LEVELS)
+        values = df[value].to_numpy(dtype=np.float64)
+        flat = Moments.from_values(values, cell_codes(codes, shape), int(np.prod(shape)))
+        self.cube = Moments(*(a.reshape(shape) for a in _arrays(flat)))
+        self.levels = {'Completed': COMPLETED_LEVELS, 'Course_Type': COURSE_TYPES, 'Device_Used': DEVICES,
+                       'Age': np.arange(AGE_LEVELS), 'Age_Band': AGE_BAND_LEVELS}
+
+        # Bands are (lower, upper] ranges of Age, as pd.cut
+        bands = [fold(_take(self.cube, range(lo + 1, hi + 1), -1), -1)
+                 for lo, hi in zip(AGE_BAND_EDGES[:-1], AGE_BAND_EDGES[1:])]
+        self.band_cube = _concat(bands, -1)
+
+        order = np.lexsort((values, codes[0]))
+        self.sorted = np.sort(values)
+        group_sizes = np.bincount(codes[0][codes[0] >= 0], minlength=len(COMPLETED_LEVELS))
+        offset = (codes[0] < 0).sum()
+        self.sorted_by_completed = np.split(values[order][offset:], np.cumsum(group_sizes)[:-1])
+
+    def moments(self, *keys):
+        """Moments with every axis except `keys` folded away (in the order given)."""
+        cube = self.band_cube if 'Age_Band' in keys else self.cube
+        names = CATEGORY_KEYS + ['Age_Band' if 'Age_Band' in keys else 'Age']
+        for axis, name in reversed(list(enumerate(names))):
+            if name not in keys:
+                cube = fold(cube, axis)
+        remaining = [name for name in names if name in keys]
+        axes = [remaining.index(key) for key in keys]
+        shape = [len(self.levels[name]) for name in remaining] or [1]
+        return Moments(*(np.transpose(a.reshape(shape), axes or [0]) for a in _arrays(cube)))
+
+    def counts(self, key):
+        return pd.Series(self.moments(key).n, index=pd.Index(self.levels[key], name=key), name='count')
+
+    def group_means(self, key):
+        return pd.Series(self.moments(key).mean, index=pd.Index(self.levels[key], name=key), name=VALUE)
+
+    def rates(self, key, outcome='Completed'):
+        """Row-normalized outcome percentages per level of `key` (pd.crosstab(normalize='index') * 100)."""
+        n = self.moments(key, outcome).n.astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            table = n / n.sum(axis=1, keepdims=True) * 100
+        return pd.DataFrame(table, index=pd.Index(self.levels[key], name=key),
+                            columns=pd.Index(self.levels[outcome], name=outcome))
+
+    def quantiles(self, quantiles=(0.25, 0.5, 0.75), completed=None):
+        values = self.sorted if completed is None else self.sorted_by_completed[COMPLETED_LEVELS.index(completed)]
+        return dict(zip(quantiles, _sorted_quantiles(values, quantiles)))
+
+    def describe(self, quantiles=(0.25, 0.5, 0.75)):
+        """Overall describe() of the value with exact quartiles."""
+        return self.moments().describe(self.quantiles(quantiles), name=VALUE)
+
+    def describe_by_completed(self):
+        """groupby('Completed')[value].describe() from the cube and the per-group sorted values."""
+        moments = self.moments('Completed')
+        rows = [moments.describe(self.quantiles(completed=level), name=level, group=g)
+                for g, level in enumerate(COMPLETED_LEVELS)]
+        return pd.DataFrame(rows).rename_axis('Completed')
+
+    def describe_age(self):
+        """describe() of Age from its histogram: each age level is merged as a zero-spread group."""
+        counts = self.moments('Age').n
+        ages = self.levels['Age'].astype(np.float64)
+        zeros = np.zeros(AGE_LEVELS)
+        present = counts > 0
+        levels = Moments(counts, ages, zeros, zeros, zeros,
+                         np.where(present, ages, np.inf), np.where(present, ages, -np.inf))
+        return fold(levels, 0).describe(histogram_quantiles(ages, counts), name='Age')
+
+    def outside(self, lower, upper):
+        """Sorted values below `lower` and above `upper` (two binary searches)."""
+        return (self.sorted[:np.searchsorted(self.sorted, lower, side='left')],
+                self.sorted[np.searchsorted(self.sorted, upper, side='right'):])
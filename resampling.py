@@ -0,0 +1,474 @@
+"""
+Resampling Engine
+Batched bootstrap, permutation and subsampling draws, reduced with NumPy and spread over worker processes
+"""
+
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from scipy import stats
+
+from accumulators import DEFAULT_WORKERS, pool_context
+
+DEFAULT_SEED = 42
+
+# Upper bound on the index + value blocks held at once per process (bytes)
+MEMORY_BUDGET = 64 * 2**20
+BYTES_PER_DRAW = np.dtype(np.intp).itemsize + np.dtype(np.float64).itemsize
+
+# Replicates per task. Each task owns one SeedSequence child, so the random
+# streams depend on the seed and this size only, never on the worker count.
+TASK_SIZE = 2500
+
+# Below this many draws in total the process pool costs more than it saves
+PARALLEL_MIN_DRAWS = 20_000_000
+
+
+# ============================================================================
+# RANDOM STREAMS AND BLOCKING
+# ============================================================================
+
+def seed_sequence(seed):
+    """Fresh SeedSequence for an int or SeedSequence seed.
+
+    SeedSequence.spawn() is stateful, so a SeedSequence argument is copied
+    first; passing the same seed twice always yields the same children.
+    """
+    if isinstance(seed, np.random.SeedSequence):
+        return np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key, pool_size=seed.pool_size)
+    return np.random.SeedSequence(seed)
+
+
+def spawn_streams(seed, k):
+    """k independent generators derived from one seed (int or SeedSequence)."""
+    return [np.random.default_rng(child) for child in seed_sequence(seed).spawn(k)]
+
+
+def block_size(draws_per_replicate, n_replicates, memory_budget=MEMORY_BUDGET):
+    """Replicates per block so one block of indices and values fits the memory budget."""
+    per_replicate = max(1, draws_per_replicate * BYTES_PER_DRAW)
+    return int(max(1, min(n_replicates, memory_budget // per_replicate)))
+
+
+# ============================================================================
+# PARALLEL EXECUTOR
+# ============================================================================
+
+# Task arguments, set once per worker process instead of pickled with every task
+_shared_args = ()
+
+
+def _set_shared_args(args):
+    global _shared_args
+    _shared_args = args
+
+
+def _run_task(job):
+    task, start, size, sequence = job
+    return task(*_shared_args, start, size, sequence)
+
+
+def run_tasks(task, n_replicates, seed=DEFAULT_SEED, args=(), n_workers=None, task_size=TASK_SIZE,
+              draws_per_replicate=0):
+    """Run task(*args, start, size, seed_sequence) over fixed chunks of replicates.
+
+    Chunk results are concatenated along their last axis in chunk order, so
+    the output is bit-identical for any number of workers. n_workers defaults
+    to DEFAULT_WORKERS (serial); pools use forked workers (see pool_context).
+    """
+    starts = range(0, n_replicates, task_size)
+    children = seed_sequence(seed).spawn(len(starts))
+    jobs = [(task, start, min(task_size, n_replicates - start), child)
+            for start, child in zip(starts, children)]
+
+    n_workers = n_workers or DEFAULT_WORKERS
+    context = pool_context()
+    if (n_workers <= 1 or len(jobs) == 1 or n_replicates * draws_per_replicate < PARALLEL_MIN_DRAWS
+            or context is None):
+        _set_shared_args(args)
+        parts = [_run_task(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(jobs)), mp_context=context,
+                                 initializer=_set_shared_args, initargs=(args,)) as pool:
+            parts = list(pool.map(_run_task, jobs))
+    return np.concatenate(parts, axis=-1)
+
+
+# ============================================================================
+# BOOTSTRAP
+# ============================================================================
+
+def percentile_interval(replicates, confidence=0.95):
+    tail = (1 - confidence) / 2 * 100
+    return np.percentile(replicates, [tail, 100 - tail])
+
+
+# ============================================================================
+# EFFECT SIZES
+# ============================================================================
+
+def effect_sizes(n1, mean1, var1, n2, mean2, var2):
+    """Cohen's d (pooled SD), Hedges' g and Glass's delta (group 2 as control).
+
+    Works elementwise, so the same formulas serve point estimates and
+    whole arrays of bootstrap replicates.
+    """
+    pooled_sd = np.sqrt(((n1 - 1) * var1 + (n2 - 1) * var2) / (n1 + n2 - 2))
+    difference = mean1 - mean2
+    cohens_d = difference / pooled_sd
+    return {
+        'cohens_d': cohens_d,
+        'hedges_g': cohens_d * (1 - 3 / (4 * (n1 + n2) - 9)),
+        'glass_delta': difference / np.sqrt(var2),
+    }
+
+
+def _moments_task(centred, memory_budget, start, size, sequence):
+    """Per-replicate sums and sums of squares, shape (group, 2, size)."""
+    streams = spawn_streams(sequence, len(centred))
+    block = block_size(sum(len(values) for values in centred), size, memory_budget)
+    moments = np.empty((len(centred), 2, size))
+    for lo in range(0, size, block):
+        rows = min(block, size - lo)
+        for g, (values, rng) in enumerate(zip(centred, streams)):
+            draws = values[rng.integers(0, len(values), size=(rows, len(values)))]
+            moments[g, 0, lo:lo + rows] = draws.sum(axis=-1)
+            moments[g, 1, lo:lo + rows] = np.einsum('ij,ij->i', draws, draws)
+    return moments
+
+
+def moment_bootstrap(samples, n_resamples=10000, seed=DEFAULT_SEED, memory_budget=MEMORY_BUDGET,
+                     n_workers=None):
+    """(n, mean, var) per sample, with mean and var as arrays over bootstrap replicates.
+
+    Only per-replicate sums and sums of squares are kept. Values are
+    centred on their sample mean first, which keeps the variances accurate.
+    """
+    samples = [np.asarray(sample, dtype=np.float64) for sample in samples]
+    shifts = [sample.mean() for sample in samples]
+    centred = [sample - shift for sample, shift in zip(samples, shifts)]
+    sums = run_tasks(_moments_task, n_resamples, seed, args=(centred, memory_budget),
+                     n_workers=n_workers, draws_per_replicate=sum(len(sample) for sample in samples))
+
+    moments = []
+    for (total, sumsq), sample, shift in zip(sums, samples, shifts):
+        n = len(sample)
+        moments.append((n, shift + total / n, (sumsq - total ** 2 / n) / (n - 1)))
+    return moments
+
+
+def effect_size_bootstrap(group1, group2, n_resamples=10000, seed=DEFAULT_SEED,
+                          memory_budget=MEMORY_BUDGET, n_workers=None):
+    """Bootstrap replicates of every effect size in effect_sizes(), from resample moments."""
+    moments = moment_bootstrap([group1, group2], n_resamples, seed, memory_budget, n_workers)
+    return effect_sizes(*moments[0], *moments[1])
+
+
+def cohens_d_se(n1, n2, d):
+    """Large-sample standard error of Cohen's d (Hedges and Olkin)."""
+    return np.sqrt((n1 + n2) / (n1 * n2) + d ** 2 / (2 * (n1 + n2)))
+
+
+# ============================================================================
+# BCa AND STUDENTIZED INTERVALS
+# ============================================================================
+
+def jackknife_moments(values):
+    """Leave-one-out (n - 1, mean, var) for every observation in O(n).
+
+    Deleting x_i gives mean_(i) = (S - x_i) / (n - 1) and
+    M2_(i) = M2 - n / (n - 1) * (x_i - mean)^2, so no refits are needed.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    centre = values.mean()
+    deviation = values - centre
+    loo_mean = centre - deviation / (n - 1)
+    loo_m2 = (deviation ** 2).sum() - n / (n - 1) * deviation ** 2
+    return n - 1, loo_mean, loo_m2 / (n - 2)
+
+
+def jackknife_effect_sizes(group1, group2):
+    """Leave-one-out effect sizes: {metric: [deletions from group 1, deletions from group 2]}."""
+    full = [(len(group), np.mean(group), np.var(group, ddof=1)) for group in (group1, group2)]
+    from_group1 = effect_sizes(*jackknife_moments(group1), *full[1])
+    from_group2 = effect_sizes(*full[0], *jackknife_moments(group2))
+    return {metric: [from_group1[metric], from_group2[metric]] for metric in from_group1}
+
+
+def acceleration(jackknife_values):
+    """BCa acceleration from per-sample leave-one-out estimates (Efron's multi-sample form)."""
+    numerator, denominator = 0.0, 0.0
+    for values in jackknife_values:
+        n = len(values)
+        u = (n - 1) * (values.mean() - values)
+        numerator += (u ** 3).sum() / n ** 3
+        denominator += (u ** 2).sum() / n ** 2
+    return numerator / (6 * denominator ** 1.5)
+
+
+def bca_interval(replicates, estimate, jackknife_values, confidence=0.95):
+    """Bias-corrected and accelerated percentile interval."""
+    z0 = stats.norm.ppf(np.mean(replicates < estimate))
+    a = acceleration(jackknife_values)
+    z = stats.norm.ppf([(1 - confidence) / 2, (1 + confidence) / 2])
+    adjusted = stats.norm.cdf(z0 + (z0 + z) / (1 - a * (z0 + z)))
+    return np.percentile(replicates, adjusted * 100)
+
+
+def studentized_interval(estimate, standard_error, replicates, replicate_errors, confidence=0.95):
+    """Bootstrap-t interval from replicate estimates and their own standard errors."""
+    t_star = (replicates - estimate) / replicate_errors
+    lower_q, upper_q = np.percentile(t_star, [(1 - confidence) / 2 * 100, (1 + confidence) / 2 * 100])
+    return np.array([estimate - upper_q * standard_error, estimate - lower_q * standard_error])
+
+
+# ============================================================================
+# SUBSAMPLING SENSITIVITY
+# ============================================================================
+
+def _sensitivity_task(centred, flags, prefix_sizes, memory_budget, start, size, sequence):
+    """(t, p) for every prefix size of each replicate's shuffled row order, shape (2, sizes, size).
+
+    A prefix of a random permutation is a uniform subsample without
+    replacement, so cumulative sums along one shuffle give every fraction at once.
+    """
+    rng = np.random.default_rng(sequence)
+    n_rows = len(centred)
+    block = block_size(6 * n_rows, size, memory_budget)
+    columns = prefix_sizes - 1
+    out = np.empty((2, len(prefix_sizes), size))
+    for lo in range(0, size, block):
+        rows = min(block, size - lo)
+        order = rng.permuted(np.broadcast_to(np.arange(n_rows), (rows, n_rows)), axis=1)
+        values, in_group1 = centred[order], flags[order]
+        n1 = np.cumsum(in_group1, axis=1)[:, columns]
+        sum_all = np.cumsum(values, axis=1)[:, columns]
+        sumsq_all = np.cumsum(values * values, axis=1)[:, columns]
+        values *= in_group1
+        sum1 = np.cumsum(values, axis=1)[:, columns]
+        sumsq1 = np.cumsum(values * values, axis=1)[:, columns]
+
+        n = prefix_sizes.astype(np.float64)
+        n0, sum0, sumsq0 = n - n1, sum_all - sum1, sumsq_all - sumsq1
+        with np.errstate(invalid='ignore', divide='ignore'):
+            m2 = (sumsq1 - sum1 ** 2 / n1) + (sumsq0 - sum0 ** 2 / n0)
+            pooled_var = m2 / (n - 2)
+            t_stat = (sum1 / n1 - sum0 / n0) / np.sqrt(pooled_var * (1 / n1 + 1 / n0))
+        out[0, :, lo:lo + rows] = t_stat.T
+        out[1, :, lo:lo + rows] = (2 * stats.t.sf(np.abs(t_stat), n - 2)).T
+    return out
+
+
+def subsample_sensitivity(values, flags, fractions, n_replicates=1000, seed=DEFAULT_SEED,
+                          memory_budget=MEMORY_BUDGET, n_workers=None):
+    """Pooled t-test (flag 1 vs flag 0) on nested random subsamples.
+
+    Returns prefix sizes and (t, p) arrays of shape (fractions, replicates).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    centred = values - values.mean()
+    flags = np.asarray(flags, dtype=np.float64)
+    prefix_sizes = np.maximum((len(values) * np.asarray(fractions)).astype(int), 1)
+    results = run_tasks(_sensitivity_task, n_replicates, seed,
+                        args=(centred, flags, prefix_sizes, memory_budget),
+                        n_workers=n_workers, draws_per_replicate=len(values))
+    return prefix_sizes, results[0], results[1]
+
+
+def sensitivity_summary(fractions, prefix_sizes, p_values, full_p_value, alpha=0.05):
+    """p-value quantiles, rejection rate and decision-flip rate (vs the full data) per fraction."""
+    rejected = p_values < alpha
+    quantiles = np.nanpercentile(p_values, [5, 25, 50, 75, 95], axis=1)
+    return pd.DataFrame({
+        'fraction': fractions, 'n': prefix_sizes,
+        'p_05': quantiles[0], 'p_25': quantiles[1], 'p_median': quantiles[2],
+        'p_75': quantiles[3], 'p_95': quantiles[4],
+        'reject_rate': rejected.mean(axis=1),
+        'flip_rate': (rejected != (full_p_value < alpha)).mean(axis=1),
+    })
+
+
+# ============================================================================
+# PERMUTATION TESTS
+# ============================================================================
+
+def _permuted_counts(codes, k, rng, rows, inner=None, n_inner=1, weights=None):
+    """(rows, k * n_inner) per-permutation group sums (or counts) of shuffled codes.
+
+    Each row permutes `codes`; optional fixed `inner` codes (e.g. Completed)
+    are crossed with the permuted ones for contingency tables.
+    """
+    permuted = rng.permuted(np.broadcast_to(codes, (rows, len(codes))), axis=1).astype(np.intp)
+    cells = permuted * n_inner if inner is None else permuted * n_inner + inner
+    cells += (np.arange(rows) * (k * n_inner))[:, None]
+    tiled = None if weights is None else np.broadcast_to(weights, (rows, len(codes))).ravel()
+    return np.bincount(cells.ravel(), weights=tiled, minlength=rows * k * n_inner).reshape(rows, -1)
+
+
+def _permutation_task(kind, codes, k, other, memory_budget, start, size, sequence):
+    """Permutation statistics for one task; `other` is the centred values or the fixed column codes."""
+    rng = np.random.default_rng(sequence)
+    block = block_size(2 * len(codes), size, memory_budget)
+    n_groups = np.bincount(codes, minlength=k)
+    out = np.empty(size)
+    for lo in range(0, size, block):
+        rows = min(block, size - lo)
+        if kind == 'chi_squared':
+            n_cols = int(other.max()) + 1
+            observed = _permuted_counts(codes, k, rng, rows, inner=other, n_inner=n_cols)
+            out[lo:lo + rows] = chi_squared_statistic(observed.reshape(rows, k, n_cols))
+        else:
+            sums = _permuted_counts(codes, k, rng, rows, weights=other)
+            out[lo:lo + rows] = _group_statistic(kind, sums, n_groups, other)
+    return out
+
+
+def _group_statistic(kind, sums, n_groups, centred):
+    """Mean difference (group 1 - group 0) or one-way F from per-group sums of centred values."""
+    if kind == 'mean_difference':
+        return sums[..., 1] / n_groups[1] - sums[..., 0] / n_groups[0]
+    # Values are centred, so SS_between = sum(S_g^2 / n_g) and SS_total is fixed
+    k, n = len(n_groups), len(centred)
+    ss_between = (sums ** 2 / n_groups).sum(axis=-1)
+    ss_total = (centred ** 2).sum()
+    return (ss_between / (k - 1)) / ((ss_total - ss_between) / (n - k))
+
+
+def chi_squared_statistic(observed):
+    """Pearson chi-squared of (..., rows, cols) tables (margins are fixed under permutation)."""
+    rows = observed.sum(axis=-1, keepdims=True)
+    cols = observed.sum(axis=-2, keepdims=True)
+    expected = rows * cols / rows.sum(axis=-2, keepdims=True)
+    return ((observed - expected) ** 2 / expected).sum(axis=(-2, -1))
+
+
+def permutation_test(kind, codes, other, n_permutations=10000, seed=DEFAULT_SEED,
+                     memory_budget=MEMORY_BUDGET, n_workers=None):
+    """Permutation distribution and p-value of one statistic.
+
+    kind: 'mean_difference' (codes 0/1, other = values; two-sided),
+          'anova_f' (codes = groups, other = values) or
+          'chi_squared' (codes = row labels, other = column codes).
+    Group labels are shuffled in (block, n) batches and reduced with bincount.
+    p-values use the (count + 1) / (B + 1) convention.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    k = int(codes.max()) + 1
+    codes = codes.astype(np.min_scalar_type(k - 1))  # compact labels keep the shuffles cheap
+    other = np.asarray(other)
+    if kind == 'chi_squared':
+        other = other.astype(np.intp)
+        n_cols = int(other.max()) + 1
+        table = np.bincount(codes * n_cols + other, minlength=k * n_cols).reshape(k, n_cols)
+        observed = chi_squared_statistic(table)
+    else:
+        other = other.astype(np.float64) - other.mean()
+        observed = _group_statistic(kind, np.bincount(codes, weights=other, minlength=k),
+                                    np.bincount(codes, minlength=k), other)
+
+    replicates = run_tasks(_permutation_task, n_permutations, seed,
+                           args=(kind, codes, k, other, memory_budget),
+                           n_workers=n_workers, draws_per_replicate=len(codes))
+    if kind == 'mean_difference':
+        extreme = np.abs(replicates) >= np.abs(observed) * (1 - 1e-12)
+    else:
+        extreme = replicates >= observed * (1 - 1e-12)
+    return {'statistic': observed, 'replicates': replicates,
+            'p_value': (extreme.sum() + 1) / (n_permutations + 1)}
+
+
+# ============================================================================
+# STREAMING POISSON / BAYESIAN BOOTSTRAP
+# ============================================================================
+
+# Rows per weight block. Weights are keyed by a row's global block, so they do
+# not depend on how the data is chunked or sharded.
+BOOTSTRAP_ROW_BLOCK = 1024
+
+
+class WeightedBootstrap:
+    """Weighted count, sum and sum of squares per group for B bootstrap replicates.
+
+    Each row gets an independent Poisson(1) weight per replicate ('poisson')
+    or an Exp(1) weight ('bayesian', the Dirichlet bootstrap up to scale), so
+    resamples are never materialized. Accumulators are sums, so shards built
+    from disjoint rows merge by addition.
+    """
+
+    def __init__(self, k, n_replicates=1000, seed=DEFAULT_SEED, kind='poisson', shift=None):
+        if kind not in ('poisson', 'bayesian'):
+            raise ValueError(f"Unknown bootstrap weights: {kind}")
+        self.k, self.n_replicates, self.kind = k, n_replicates, kind
+        self.sequence = seed_sequence(seed)
+        self.shift = shift
+        self.count = np.zeros(k, dtype=np.int64)
+        self.weight = np.zeros((k, n_replicates))
+        self.sum = np.zeros((k, n_replicates))
+        self.sumsq = np.zeros((k, n_replicates))
+
+    def _block_weights(self, block_id):
+        sequence = np.random.SeedSequence(self.sequence.entropy, spawn_key=self.sequence.spawn_key + (block_id,),
+                                          pool_size=self.sequence.pool_size)
+        rng = np.random.default_rng(sequence)
+        shape = (BOOTSTRAP_ROW_BLOCK, self.n_replicates)
+        if self.kind == 'poisson':
+            return rng.poisson(1.0, size=shape).astype(np.float64)
+        return rng.standard_exponential(size=shape)
+
+    def update(self, codes, values, row_ids):
+        """Fold in rows with group codes, values and global row numbers (e.g. the CSV line)."""
+        codes, values = np.asarray(codes), np.asarray(values, dtype=np.float64)
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        valid = (codes >= 0) & ~np.isnan(values)
+        codes, values, row_ids = codes[valid].astype(np.intp), values[valid], row_ids[valid]
+        if len(values) == 0:
+            return self
+        if self.shift is None:
+            self.shift = float(values.mean())
+        centred = values - self.shift
+        self.count += np.bincount(codes, minlength=self.k)
+
+        blocks = row_ids // BOOTSTRAP_ROW_BLOCK
+        for block_id in np.unique(blocks):
+            in_block = blocks == block_id
+            weights = self._block_weights(int(block_id))[row_ids[in_block] % BOOTSTRAP_ROW_BLOCK]
+            onehot = np.zeros((in_block.sum(), self.k))
+            onehot[np.arange(len(onehot)), codes[in_block]] = 1.0
+            x = centred[in_block][:, None]
+            # One matmul yields the weighted count, sum and sum of squares of every group
+            design = np.concatenate([onehot, onehot * x, onehot * x * x], axis=1)
+            totals = design.T @ weights
+            self.weight += totals[:self.k]
+            self.sum += totals[self.k:2 * self.k]
+            self.sumsq += totals[2 * self.k:]
+        return self
+
+    def _shifted(self, shift):
+        """Sums re-expressed around another shift (exact)."""
+        delta = self.shift - shift
+        return (self.sum + self.weight * delta,
+                self.sumsq + 2 * delta * self.sum + self.weight * delta ** 2)
+
+    def merge(self, other):
+        """Combine with a shard built from different rows under the same seed and settings."""
+        if other.shift is None:
+            return self
+        if self.shift is None:
+            return other
+        merged = WeightedBootstrap(self.k, self.n_replicates, self.sequence, self.kind, self.shift)
+        other_sum, other_sumsq = other._shifted(self.shift)
+        merged.count = self.count + other.count
+        merged.weight = self.weight + other.weight
+        merged.sum = self.sum + other_sum
+        merged.sumsq = self.sumsq + other_sumsq
+        return merged
+
+    __add__ = merge
+
+    def moments(self):
+        """(n, mean, var) per group as arrays over replicates; n is the replicate's total weight."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = self.shift + self.sum / self.weight
+            variances = (self.sumsq - self.sum ** 2 / self.weight) / (self.weight - 1)
+        return [(self.weight[g], means[g], variances[g]) for g in range(self.k)]
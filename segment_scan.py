@@ -0,0 +1,174 @@
+"""
+Segment Scan Mode
+Runs Tests 2, 4 and 5 in every Course_Type x Device_Used x age band slice from one dense cube
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from data_loader import load_clean_data, age_bands
+from accumulators import key_codes, cell_codes, sharded_moments
+from sufficient_stats import VALUE, benjamini_hochberg
+
+SEGMENT_KEYS = ['Course_Type', 'Device_Used', 'Age_Band']
+OUTCOME = 'Completed'
+ALL = 'All'  # rollup level appended to every segment key
+OUTPUT_FILE = 'segment_scan_results.csv'
+
+
+# ============================================================================
+# DENSE SEGMENT CUBE
+# ============================================================================
+
+def collapse(n, mean, m2, axis):
+    """Exact merge of n/mean/M2 arrays along one axis (kept with length 1)."""
+    total = n.sum(axis=axis, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        merged = np.where(total > 0, (n * mean).sum(axis=axis, keepdims=True) / total, 0.0)
+    spread = np.where(n > 0, n * (mean - merged) ** 2, 0.0)
+    return total, merged, m2.sum(axis=axis, keepdims=True) + spread.sum(axis=axis, keepdims=True)
+
+
+class SegmentCube:
+    """n, mean and M2 of the value over segment keys x outcome.
+
+    Every segment key carries an extra trailing 'All' level, so rows for
+    partial rollups (e.g. one course across all devices) come for free.
+    """
+
+    def __init__(self, n, mean, m2, keys, levels, outcome_levels):
+        self.n, self.mean, self.m2 = n, mean, m2
+        self.keys = list(keys)
+        self.levels = [list(level) for level in levels]
+        self.outcome_levels = list(outcome_levels)
+
+    @classmethod
+    def from_frame(cls, df, keys=SEGMENT_KEYS, outcome=OUTCOME, value=VALUE, n_workers=None):
+        codes, levels = key_codes(df, list(keys) + [outcome])
+        shape = tuple(len(level) for level in levels)
+        moments = sharded_moments(df[value].to_numpy(), cell_codes(codes, shape), int(np.prod(shape)),
+                                  n_workers=n_workers)
+        arrays = (moments.n.reshape(shape).astype(np.float64), moments.mean.reshape(shape),
+                  moments.m2.reshape(shape))
+
+        # Append the 'All' level one key at a time; later keys see earlier rollups
+        for axis in range(len(keys)):
+            arrays = tuple(np.concatenate([full, rolled], axis=axis)
+                           for full, rolled in zip(arrays, collapse(*arrays, axis)))
+        levels = [list(level) + [ALL] for level in levels[:-1]] + [levels[-1]]
+        return cls(*arrays, keys, levels[:-1], levels[-1])
+
+    def groups(self, key):
+        """Outcome-merged arrays with the 'All' level of `key` dropped (one entry per group)."""
+        axis = self.keys.index(key)
+        merged = (a[..., 0] for a in collapse(self.n, self.mean, self.m2, -1))
+        return [np.delete(a, -1, axis=axis) for a in merged]
+
+
+# ============================================================================
+# VECTORIZED TESTS
+# ============================================================================
+
+def _results_frame(cube, test, n, statistic, df1, df2, p_value, tested=None):
+    """One row per segment; the tested key (if any) is reported as 'All'."""
+    levels = [[ALL] if key == tested else level for key, level in zip(cube.keys, cube.levels)]
+    shape = tuple(len(level) for level in levels)
+    columns = {'n': n, 'statistic': statistic, 'df1': df1, 'df2': df2, 'p_value': p_value}
+    columns = {name: np.broadcast_to(values, shape).ravel() for name, values in columns.items()}
+    index = pd.MultiIndex.from_product(levels, names=cube.keys)
+    frame = pd.DataFrame(columns, index=index).reset_index()
+    frame.insert(0, 'test', test)
+    frame['q_value'] = benjamini_hochberg(frame['p_value'])
+    return frame
+
+
+def segment_t_tests(cube, success='Yes'):
+    """Test 2 in every segment: pooled two-sample t-test, success vs the other outcome."""
+    yes = cube.outcome_levels.index(success)
+    other = 1 - yes
+    n1, n2 = cube.n[..., yes], cube.n[..., other]
+    df_within = n1 + n2 - 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pooled_var = (cube.m2[..., yes] + cube.m2[..., other]) / df_within
+        t_stat = (cube.mean[..., yes] - cube.mean[..., other]) / np.sqrt(pooled_var * (1 / n1 + 1 / n2))
+    p_value = 2 * stats.t.sf(np.abs(t_stat), np.where(df_within > 0, df_within, np.nan))
+    return _results_frame(cube, 'Test 2 (t)', n1 + n2, t_stat, df_within, np.nan, p_value)
+
+
+def segment_chi_squared(cube, key='Course_Type'):
+    """Test 4 in every segment: chi-squared of `key` x outcome (Yates when df = 1, as scipy)."""
+    axis = cube.keys.index(key)
+    observed = np.moveaxis(np.delete(cube.n, -1, axis=axis), axis, -2)
+    rows = observed.sum(axis=-1, keepdims=True)
+    cols = observed.sum(axis=-2, keepdims=True)
+    total = rows.sum(axis=-2, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        expected = rows * cols / total
+    dof = ((rows > 0).sum(axis=-2) - 1) * ((cols > 0).sum(axis=-1) - 1)
+
+    diff = expected - observed
+    correction = np.where((dof == 1)[..., None], np.sign(diff) * np.minimum(0.5, np.abs(diff)), 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cells = np.where(expected > 0, (observed + correction - expected) ** 2 / expected, 0.0)
+    dof = np.where(dof[..., 0] > 0, dof[..., 0], np.nan)
+    chi2_stat = np.where(dof > 0, cells.sum(axis=(-2, -1)), np.nan)
+    p_value = stats.chi2.sf(chi2_stat, dof)
+
+    # Put the tested key back as a length-1 axis so rows line up with the other tests
+    total, chi2_stat, dof, p_value = (np.expand_dims(a, axis)
+                                      for a in (total[..., 0, 0], chi2_stat, dof, p_value))
+    return _results_frame(cube, 'Test 4 (chi2)', total, chi2_stat, dof, np.nan, p_value, tested=key)
+
+
+def segment_anova(cube, key='Device_Used'):
+    """Test 5 in every segment: one-way ANOVA of the value across the levels of `key`."""
+    axis = cube.keys.index(key)
+    n, mean, m2 = cube.groups(key)
+    total, grand_mean, _ = collapse(n, mean, m2, axis)
+    n_groups = (n > 0).sum(axis=axis, keepdims=True)
+    ss_between = np.where(n > 0, n * (mean - grand_mean) ** 2, 0.0).sum(axis=axis, keepdims=True)
+    ss_within = m2.sum(axis=axis, keepdims=True)
+    df_between, df_within = n_groups - 1.0, total - n_groups
+    with np.errstate(invalid='ignore', divide='ignore'):
+        f_stat = (ss_between / df_between) / (ss_within / df_within)
+    valid = (df_between > 0) & (df_within > 0)
+    f_stat = np.where(valid, f_stat, np.nan)
+    p_value = stats.f.sf(f_stat, np.where(valid, df_between, np.nan), np.where(valid, df_within, np.nan))
+    return _results_frame(cube, 'Test 5 (F)', total, f_stat, df_between, df_within, p_value, tested=key)
+
+
+# ============================================================================
+# SCAN
+# ============================================================================
+
+def scan_segments(df=None, n_workers=None):
+    """Single results table of Tests 2, 4 and 5 for every segment and rollup.
+
+    q_value is the Benjamini-Hochberg adjustment within each test family.
+    """
+    df = load_clean_data() if df is None else df
+    df = df.assign(Age_Band=age_bands(df['Age']))
+    cube = SegmentCube.from_frame(df, n_workers=n_workers)
+    return pd.concat([segment_t_tests(cube), segment_chi_squared(cube), segment_anova(cube)],
+                     ignore_index=True)
+
+
+def print_segment_report(results, output_file=OUTPUT_FILE, top=10):
+    print("\n" + "="*80)
+    print("SEGMENT SCAN - TESTS 2, 4 AND 5 ACROSS COURSE x DEVICE x AGE BAND")
+    print("="*80)
+
+    for test, rows in results.groupby('test', sort=False):
+        tested = rows.dropna(subset=['p_value'])
+        print(f"\n{test}: {len(rows)} segments, {len(tested)} testable, "
+              f"{(tested['p_value'] < 0.05).sum()} with p < 0.05, "
+              f"{(tested['q_value'] < 0.05).sum()} with q < 0.05")
+
+    print(f"\nSmallest p-values (top {top}):")
+    columns = ['test'] + SEGMENT_KEYS + ['n', 'statistic', 'p_value', 'q_value']
+    print(results.nsmallest(top, 'p_value')[columns].to_string(index=False))
+
+    results.to_csv(output_file, index=False)
+    print(f"\n✓ Saved: {output_file}")
+    return results
@@ -0,0 +1,245 @@
+"""
+Streaming Ingestion Mode
+Folds fixed-size CSV chunks into bounded-memory accumulators for Tests 2-6
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.stats import chi2_contingency
+
+from data_loader import (DATA_FILE, CHUNK_SIZE, COMPLETED_LEVELS, COURSE_TYPES, DEVICES, AGE_LEVELS, RULES,
+                         SeenIds, iter_chunks, validate)
+from sufficient_stats import two_sample_t, one_sample_t, one_way_anova, two_proportion_z
+from accumulators import QuantileSketch
+from resampling import DEFAULT_SEED, WeightedBootstrap, effect_sizes, percentile_interval
+
+HYPOTHESIZED_MEAN = 15.0
+# Suggested replicates for the opt-in Poisson bootstrap (`main.py --stream --bootstrap N`);
+# each replicate costs one Poisson draw per row, so the default pass skips it
+BOOTSTRAP_REPLICATES = 1000
+
+
+# ============================================================================
+# ACCUMULATORS
+# ============================================================================
+
+class GroupSums:
+    """Count, sum and sum of squares per category level.
+
+    Values are shifted by the first observed mean before squaring so the
+    sum-of-squares variance does not lose precision on large exports.
+    """
+
+    def __init__(self, levels):
+        self.levels = list(levels)
+        self.shift = None
+        self.count = np.zeros(len(self.levels), dtype=np.int64)
+        self.sum = np.zeros(len(self.levels))
+        self.sumsq = np.zeros(len(self.levels))
+
+    def update(self, codes, values):
+        valid = codes >= 0
+        codes, values = codes[valid], np.asarray(values, dtype=np.float64)[valid]
+        if len(values) == 0:
+            return
+        if self.shift is None:
+            self.shift = float(values.mean())
+        centred = values - self.shift
+        k = len(self.levels)
+        self.count += np.bincount(codes, minlength=k)
+        self.sum += np.bincount(codes, weights=centred, minlength=k)
+        self.sumsq += np.bincount(codes, weights=centred * centred, minlength=k)
+
+    def mean(self):
+        return self.shift + self.sum / self.count
+
+    def var(self):
+        return (self.sumsq - self.sum ** 2 / self.count) / (self.count - 1)
+
+    def std(self):
+        return np.sqrt(self.var())
+
+    def to_frame(self):
+        """n/mean/std/M2 per level, in the layout the sufficient-statistics engine reads."""
+        frame = pd.DataFrame({'n': self.count, 'mean': self.mean(), 'std': self.std(),
+                              'm2': self.var() * (self.count - 1)}, index=self.levels)
+        return frame[frame['n'] > 0]
+
+
+class StreamingSummary:
+    """Everything Tests 2-6 need, accumulated one chunk at a time.
+
+    With n_bootstrap > 0 a Poisson bootstrap of the completion groups is
+    folded into the same pass, for CIs on their means and effect sizes.
+    """
+
+    def __init__(self, n_bootstrap=0, seed=DEFAULT_SEED):
+        self.n_rows = 0
+        self.rule_counts = pd.Series(0, index=[name for name, _, _ in RULES], name='rows')
+        self.seen_ids = SeenIds()
+        self.overall = GroupSums(['All'])
+        self.by_completed = GroupSums(COMPLETED_LEVELS)
+        self.by_course = GroupSums(COURSE_TYPES)
+        self.by_device = GroupSums(DEVICES)
+        self.course_by_completed = np.zeros((len(COURSE_TYPES), len(COMPLETED_LEVELS)), dtype=np.int64)
+        self.age_by_completed = np.zeros((AGE_LEVELS, len(COMPLETED_LEVELS)), dtype=np.int64)
+        # Bounded-memory quantiles for medians, IQR fences and box plots
+        self.sketches = {level: QuantileSketch(seed=seed) for level in ['All'] + COMPLETED_LEVELS}
+        self.bootstrap = WeightedBootstrap(len(COMPLETED_LEVELS), n_bootstrap, seed) if n_bootstrap else None
+
+    @property
+    def n_negative(self):
+        return int(self.rule_counts['negative_time'])
+
+    @property
+    def n_clean(self):
+        return int(self.overall.count[0])
+
+    def update(self, chunk):
+        self.n_rows += len(chunk)
+        report = validate(chunk, seen_ids=self.seen_ids)
+        self.rule_counts += report.counts
+        self.seen_ids.add(chunk['User_ID'].to_numpy(dtype=np.float64, na_value=np.nan))
+
+        keep = report.valid
+        time = chunk['Time_Spent_Hours'].to_numpy(dtype=np.float64)[keep]
+        row_ids = chunk.index.to_numpy()[keep]
+        completed = chunk['Completed'].cat.codes.to_numpy()[keep]
+        course = chunk['Course_Type'].cat.codes.to_numpy()[keep]
+        device = chunk['Device_Used'].cat.codes.to_numpy()[keep]
+        age = chunk['Age'].to_numpy()[keep]
+
+        self.overall.update(np.zeros(len(time), dtype=np.int8), time)
+        self.by_completed.update(completed, time)
+        self.by_course.update(course, time)
+        self.by_device.update(device, time)
+        self.sketches['All'].update(time)
+        for code, level in enumerate(COMPLETED_LEVELS):
+            self.sketches[level].update(time[completed == code])
+        if self.bootstrap is not None:
+            self.bootstrap.update(completed, time, row_ids)
+
+        n_done = len(COMPLETED_LEVELS)
+        both = (course >= 0) & (completed >= 0)
+        cells = course[both].astype(np.int64) * n_done + completed[both]
+        self.course_by_completed += np.bincount(cells, minlength=self.course_by_completed.size).reshape(
+            self.course_by_completed.shape)
+
+        labelled = completed >= 0
+        cells = age[labelled].astype(np.int64) * n_done + completed[labelled]
+        self.age_by_completed += np.bincount(cells, minlength=self.age_by_completed.size).reshape(
+            self.age_by_completed.shape)
+        return self
+
+
+def stream_summary(path=DATA_FILE, chunksize=CHUNK_SIZE, n_bootstrap=0):
+    """Single bounded-memory pass over the export; n_bootstrap > 0 adds bootstrap CIs."""
+    summary = StreamingSummary(n_bootstrap)
+    for chunk in iter_chunks(path, chunksize=chunksize):
+        summary.update(chunk)
+    return summary
+
+
+# ============================================================================
+# TESTS 2-6 FROM ACCUMULATORS
+# ============================================================================
+
+def streaming_tests(summary, hypothesized_mean=HYPOTHESIZED_MEAN):
+    """Compute the Test 2-6 statistics of main.py from a StreamingSummary."""
+    results = {}
+
+    # Test 2: pooled two-sample t-test, Completed Yes vs No
+    by_completed = summary.by_completed.to_frame()
+    t_stat, p_value = two_sample_t(by_completed.loc['Yes'], by_completed.loc['No'])
+    results['test2'] = {'t': t_stat, 'p': p_value}
+
+    # Test 3: one-sample t-test against the benchmark, one-tailed (greater than)
+    everyone = summary.overall.to_frame().iloc[0]
+    t_one, p_two = one_sample_t(everyone, hypothesized_mean)
+    results['test3'] = {'t': t_one, 'p': p_two / 2 if t_one > 0 else 1 - p_two / 2,
+                        'mean': everyone['mean']}
+
+    # Test 4: chi-squared test of independence on the streamed contingency table
+    chi2_stat, p_chi2, dof_chi2, _ = chi2_contingency(summary.course_by_completed)
+    results['test4'] = {'chi2': chi2_stat, 'p': p_chi2, 'df': dof_chi2}
+
+    # Test 5: one-way ANOVA across devices
+    results['test5'] = one_way_anova(summary.by_device.to_frame())
+
+    # Test 6: proportion z-test, below vs above the average age
+    yes = COMPLETED_LEVELS.index('Yes')
+    ages = np.arange(AGE_LEVELS)
+    age_counts = summary.age_by_completed.sum(axis=1)
+    average_age = (ages * age_counts).sum() / age_counts.sum()
+    below = ages < average_age
+    z_test = two_proportion_z(summary.age_by_completed[below, yes].sum(), age_counts[below].sum(),
+                              summary.age_by_completed[~below, yes].sum(), age_counts[~below].sum())
+    results['test6'] = dict(z_test, average_age=average_age)
+
+    # Box-plot statistics and 1.5 x IQR fences from the quantile sketches
+    results['box_stats'] = {level: sketch.box_stats(label=level) for level, sketch in summary.sketches.items()}
+
+    # Poisson bootstrap CIs (Completed vs Not Completed), if one was streamed
+    if summary.bootstrap is not None:
+        (n_no, mean_no, var_no), (n_yes, mean_yes, var_yes) = summary.bootstrap.moments()
+        results['bootstrap'] = {
+            'replicates': summary.bootstrap.n_replicates,
+            'mean_yes': percentile_interval(mean_yes),
+            'mean_no': percentile_interval(mean_no),
+            'difference': percentile_interval(mean_yes - mean_no),
+            'cohens_d': percentile_interval(effect_sizes(n_yes, mean_yes, var_yes,
+                                                         n_no, mean_no, var_no)['cohens_d']),
+        }
+    return results
+
+
+def print_streaming_report(summary):
+    results = streaming_tests(summary)
+
+    print("\n" + "="*80)
+    print("STREAMING MODE - TESTS 2-6 FROM CHUNKED ACCUMULATORS")
+    print("="*80)
+    print(f"\nRows streamed: {summary.n_rows}")
+    print(f"Negative time values removed: {summary.n_negative}")
+    other_violations = summary.rule_counts.drop('negative_time')
+    if other_violations.any():
+        print("Other validation failures removed: " +
+              ", ".join(f"{name} {count}" for name, count in other_violations[other_violations > 0].items()))
+    print(f"Final clean data: {summary.n_clean} rows")
+
+    test2, test3, test4 = results['test2'], results['test3'], results['test4']
+    test5, test6 = results['test5'], results['test6']
+    print(f"""
+2. Time Spent by Completion Status (Two-Sample T-Test):
+   - t-statistic: {test2['t']:.4f}, p-value: {test2['p']:.4f}
+
+3. Average Time Exceeds 15 Hours (One-Sample T-Test):
+   - t-statistic: {test3['t']:.4f}, p-value (one-tailed): {test3['p']:.4f}
+   - Sample mean: {test3['mean']:.2f} hours
+
+4. Course Type and Completion Status (Chi-Squared Test):
+   - Chi-squared: {test4['chi2']:.4f}, df: {test4['df']}, p-value: {test4['p']:.4f}
+
+5. Device Used and Time Spent (One-Way ANOVA):
+   - F-statistic: {test5['F']:.4f}, p-value: {test5['p']:.4f}
+
+6. Below Average Age and Completion Rate (Proportion Z-Test):
+   - z-statistic: {test6['z']:.4f}, p-value (one-tailed): {test6['p']:.4f}
+   - Below avg completion rate: {test6['p1']*100:.2f}%
+   - Above avg completion rate: {test6['p2']*100:.2f}%
+""")
+
+    print("Time Spent Quantiles (KLL sketch, ~1.65% rank error; 1.5 x IQR fences):")
+    for level, box in results['box_stats'].items():
+        print(f"   - {level:>3}: Q1 {box['q1']:.2f}, median {box['med']:.2f}, Q3 {box['q3']:.2f}, "
+              f"fences [{box['fence_low']:.2f}, {box['fence_high']:.2f}], "
+              f"whiskers [{box['whislo']:.2f}, {box['whishi']:.2f}], ~{box['n_outside']:.0f} outside")
+    print()
+
+    if 'bootstrap' in results:
+        boot = results['bootstrap']
+        print(f"Poisson Bootstrap CIs (95%, {boot['replicates']} replicates, same streamed pass):")
+        for key, label in [('mean_yes', 'Mean time, completed'), ('mean_no', 'Mean time, not completed'),
+                           ('difference', 'Difference in means'), ('cohens_d', "Cohen's d")]:
+            print(f"   - {label}: [{boot[key][0]:.4f}, {boot[key][1]:.4f}]")
+    return results
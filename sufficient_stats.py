@@ -0,0 +1,144 @@
+"""
+Sufficient-Statistics Engine
+One grouped pass collects per-cell n/mean/M2; every test is computed from those aggregates
+"""
+
+import numpy as np
+from scipy import stats
+from scipy.stats import ttest_ind_from_stats
+
+from accumulators import grouped_moments
+
+VALUE = 'Time_Spent_Hours'
+
+# Every test in main.py groups by a subset of these keys, so one cube covers them all
+CUBE_KEYS = ['Completed', 'Course_Type', 'Device_Used', 'Age']
+
+
+# ============================================================================
+# GROUPED PASS
+# ============================================================================
+
+def build_cube(df, keys=CUBE_KEYS, value=VALUE, n_workers=None):
+    """Single grouped pass: n, mean, M2, min and max of `value` per key combination.
+
+    Large frames are summarized in sharded worker processes and merged exactly.
+    """
+    cube = grouped_moments(df, keys, value, n_workers=n_workers)
+    return cube[['n', 'mean', 'm2', 'min', 'max']]
+
+
+def marginal(cube, by=None):
+    """Merge cube cells into groups (or one overall row) without touching the data.
+
+    Uses the exact parallel combination M2 = sum(M2_i) + sum(n_i * (mean_i - mean)^2).
+    """
+    if by is None:
+        keys = np.zeros(len(cube), dtype=np.int8)
+    elif isinstance(by, str):
+        keys = cube.index.get_level_values(by)
+    else:
+        keys = [cube.index.get_level_values(level) for level in by]
+
+    n = cube['n'].to_numpy()
+    grouped = cube.assign(total=n * cube['mean']).groupby(keys, observed=True)
+    out = grouped.agg(n=('n', 'sum'), total=('total', 'sum'), m2=('m2', 'sum'),
+                      min=('min', 'min'), max=('max', 'max'))
+    out['mean'] = out.pop('total') / out['n']
+
+    # Spread of the cell means around their merged group mean
+    group_id = grouped.ngroup().to_numpy()
+    spread = n * (cube['mean'].to_numpy() - out['mean'].to_numpy()[group_id]) ** 2
+    out['m2'] += np.bincount(group_id, weights=spread, minlength=len(out))
+    out['var'] = out['m2'] / (out['n'] - 1)
+    out['std'] = np.sqrt(out['var'])
+    return out[['n', 'mean', 'std', 'var', 'm2', 'min', 'max']]
+
+
+def overall(cube):
+    return marginal(cube).iloc[0]
+
+
+def counts(cube, rows, cols):
+    """Contingency table of row counts, e.g. Course_Type x Completed."""
+    return marginal(cube, by=[rows, cols])['n'].unstack(fill_value=0).astype(np.int64)
+
+
+# ============================================================================
+# TEST STATISTICS FROM AGGREGATES
+# ============================================================================
+
+def two_sample_t(group1, group2, equal_var=True):
+    """Two-sample t-test from (n, mean, std) rows; two-tailed p-value."""
+    return ttest_ind_from_stats(group1['mean'], group1['std'], group1['n'],
+                                group2['mean'], group2['std'], group2['n'],
+                                equal_var=equal_var)
+
+
+def one_sample_t(group, popmean):
+    """One-sample t-test from an (n, mean, std) row; two-tailed p-value."""
+    n = group['n']
+    t_stat = (group['mean'] - popmean) / (group['std'] / np.sqrt(n))
+    return t_stat, 2 * stats.t.sf(abs(t_stat), n - 1)
+
+
+def one_way_anova(groups):
+    """One-way ANOVA table from per-group (n, mean, m2) rows."""
+    n, means, m2 = groups['n'].to_numpy(), groups['mean'].to_numpy(), groups['m2'].to_numpy()
+    grand_mean = (n * means).sum() / n.sum()
+    ss_between = float((n * (means - grand_mean) ** 2).sum())
+    ss_within = float(m2.sum())
+    df_between, df_within = len(n) - 1, int(n.sum()) - len(n)
+    ms_between, ms_within = ss_between / df_between, ss_within / df_within
+    f_stat = ms_between / ms_within
+    return {
+        'ss_between': ss_between, 'ss_within': ss_within, 'ss_total': ss_between + ss_within,
+        'df_between': df_between, 'df_within': df_within,
+        'ms_between': ms_between, 'ms_within': ms_within,
+        'F': f_stat, 'p': stats.f.sf(f_stat, df_between, df_within),
+    }
+
+
+def two_proportion_z(x1, n1, x2, n2):
+    """Pooled two-proportion z-test; one-tailed p-value for p1 > p2."""
+    p1, p2 = x1 / n1, x2 / n2
+    p_pooled = (x1 + x2) / (n1 + n2)
+    se = np.sqrt(p_pooled * (1 - p_pooled) * (1 / n1 + 1 / n2))
+    z_stat = (p1 - p2) / se
+    return {'p1': p1, 'p2': p2, 'p_pooled': p_pooled, 'se': se, 'z': z_stat,
+            'p': stats.norm.sf(z_stat)}
+
+
+def benjamini_hochberg(p_values):
+    """Benjamini-Hochberg adjusted p-values (q-values); NaNs are left out of the ranking."""
+    p_values = np.asarray(p_values, dtype=np.float64)
+    q_values = np.full(p_values.shape, np.nan)
+    finite = np.flatnonzero(~np.isnan(p_values))
+    if len(finite) == 0:
+        return q_values
+    order = finite[np.argsort(p_values[finite])]
+    ranked = p_values[order] * len(order) / np.arange(1, len(order) + 1)
+    q_values[order] = np.minimum(1.0, np.minimum.accumulate(ranked[::-1])[::-1])
+    return q_values
+
+
+# ============================================================================
+# STUDY-SPECIFIC GROUPINGS
+# ============================================================================
+
+def level_mean(cube, level):
+    """Row-weighted mean of a numeric cube key, e.g. the average Age."""
+    values = cube.index.get_level_values(level).to_numpy(dtype=np.float64)
+    return float((values * cube['n'].to_numpy()).sum() / cube['n'].sum())
+
+
+def age_split(cube, threshold, success='Yes'):
+    """(completed, n) for the Below/Above Average age groups used by Test 6."""
+    age = cube.index.get_level_values('Age')
+    below = age < threshold
+    done = cube.index.get_level_values('Completed') == success
+    n = cube['n'].to_numpy()
+    return {
+        'Below Average': (int(n[below & done].sum()), int(n[below].sum())),
+        'Above Average': (int(n[~below & done].sum()), int(n[~below].sum())),
+    }